@@ -1,136 +1,308 @@
-from flask import Flask, request, jsonify
-import requests
+import hmac
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import Flask, Response, request, jsonify, stream_with_context
+
+import bulk
+import output
+import pipeline
+import upstream
+from breaker import CircuitOpenError
+from deadline import Deadline, DeadlineExceeded
+from prompts import INVALID_RESPONSE
 
 app = Flask(__name__)
 
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-
-COPSTAR_PROMPT = """
-You are a professional Medicare-style health assistant. Your response must always be clean, neutral, and clinically supportive.
-
----------------------------------
-STRICT NON-NEGOTIABLE RULES
----------------------------------
-- Do NOT repeat or restate the user’s input.
-- Do NOT generate headings, titles, or intros (e.g., “Here are your tips:”, “Assistant Response:”).
-- Do NOT mention your role or how you created the answer.
-- Do NOT add emojis unless the user includes emojis.
-- Do NOT include blank lines before the first bullet or after the last bullet.
-- Do NOT add explanations, summaries, or closing remarks.
-- ONLY output bullet points (unless INVALID MODE is triggered).
-
-Your output must ALWAYS follow one of these:
-1) EXACTLY 4 bullets (BMI MODE or SYMPTOM MODE)
-2) A single sentence (INVALID MODE)
-
-Nothing else is permitted.
-
----------------------------------
-MODE CLASSIFICATION RULES
----------------------------------
-Classify the user input strictly into:
-
-A) BMI MODE
-   Trigger ONLY if:
-   - Height is provided (cm or meters)
-   - Weight is provided (kg)
-   BOTH must be present.
-
-B) SYMPTOM MODE
-   Trigger if:
-   - User expresses symptoms (ex: fever, cough, headache, nausea, pain)
-   - User expresses goals (ex: “I want to lose weight”, “I want to gain weight”)
-   - User gives ONLY height OR ONLY weight (not both)
-   In this mode: IGNORE BMI completely.
-
-C) INVALID MODE
-   Trigger if:
-   - No symptoms
-   - No health concerns
-   - No height/weight information
-
-INVALID MODE OUTPUT:
-"Please share your symptoms or your height and weight so I can help you better."
-(No bullets allowed.)
-
----------------------------------
-BMI MODE RULES
----------------------------------
-Only run BMI calculation if BOTH values exist.
-
-1) Convert height:
-   - If user gives cm → convert to meters.
-
-2) Compute:
-   BMI = Weight(kg) / (Height(m)²)
-   Round to 1 decimal.
-
-3) Classify:
-   < 18.5    → Low
-   18.5–24.9 → Normal
-   >= 25     → High
-
-Bullet 1 MUST include:
-- BMI value (1 decimal)
-- Category
-- Clear advice: gain / maintain / reduce weight
-
----------------------------------
-SYMPTOM MODE RULES
----------------------------------
-- DO NOT calculate BMI.
-- DO NOT mention BMI.
-- Provide 4 supportive, simple, medically safe guidance bullets.
-
----------------------------------
-OUTPUT FORMAT RULES
----------------------------------
-For BMI MODE or SYMPTOM MODE:
-- EXACTLY 4 bullets.
-- EACH bullet must start with "- ".
-- No blank lines, no intros, no closings, no disclaimers.
-- Maintain a professional Medicare tone: calm, supportive, simple.
-"""
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+# Upstream calls in flight at once across all batch requests in a worker
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(upstream.POOL_MAXSIZE)))
+
+_batch_executor = None
+
+# Anything that means "no usable reply from upstream in time"
+UPSTREAM_FAILURES = (
+    requests.RequestException,
+    upstream.UpstreamError,
+    DeadlineExceeded,
+    TimeoutError,
+    CircuitOpenError
+)
+
+
+@app.before_request
+def require_admin_token():
+    # The admin endpoints are off unless ADMIN_TOKEN is set: this app is a
+    # public webhook, and an open DELETE /admin/cache is a free way to
+    # make every request go upstream
+    if not request.path.startswith("/admin/"):
+        return None
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token, ADMIN_TOKEN):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+
+def fetch_tip(user_input, mode, deadline):
+    if pipeline.micro_batcher is not None:
+        ai_msg = pipeline.micro_batcher.submit(mode, user_input, deadline)
+        if ai_msg is not None:
+            return ai_msg
+
+    # Each attempt is a cascade tier, or a plain retry when the cascade is
+    # off; only replies that cannot be repaired move on to the next one
+    attempts = pipeline.upstream_attempts(mode)
+    checked = None
+    for index, tier in enumerate(attempts):
+        def call():
+            with pipeline.upstream_call(mode, tier) as model:
+                return model, upstream.fetch_message(upstream.build_payload(user_input, model, mode), deadline)
 
+        try:
+            model, ai_msg = pipeline.retries.run(call, deadline)
+        except UPSTREAM_FAILURES:
+            # A later attempt running out of time still leaves the last reply
+            if checked is None:
+                raise
+            return checked.text
+        checked = output.repair(ai_msg)
+        output.record(checked.status)
+        last = index == len(attempts) - 1
+        if checked.status != output.FAILED or last:
+            if tier is not None:
+                pipeline.record_cascade(model, escalated=False)
+            return checked.text
+        if tier is not None:
+            pipeline.record_cascade(model, escalated=True)
+        output.record("retries")
+
+
+def generate_tip(user_input, deadline=None, lookup=pipeline.cached_answer, store=True):
+    # Returns (mode, reply, source) where source is local, cache, semantic,
+    # upstream, fallback (upstream failed) or degraded (circuit open). Batches pass a
+    # lookup into replies they already fetched from the cache together, and
+    # store=False to store their upstream replies together too.
+    result, tip = pipeline.local_answer(user_input)
+    if tip is not None:
+        return result.mode, tip, "local"
+
+    ai_msg = lookup(user_input)
+    if ai_msg is not None:
+        return result.mode, ai_msg, "cache"
+
+    ai_msg = pipeline.semantic_answer(user_input, result.mode)
+    if ai_msg is not None:
+        return result.mode, ai_msg, "semantic"
+
+    try:
+        ai_msg = pipeline.fetch_once(user_input, result.mode, fetch_tip, deadline or Deadline(), store)
+    except CircuitOpenError:
+        return result.mode, pipeline.fallback_answer(user_input, result), "degraded"
+    except UPSTREAM_FAILURES:
+        return result.mode, pipeline.fallback_answer(user_input, result), "fallback"
+    return result.mode, ai_msg, "upstream"
+
+
+def get_batch_executor():
+    global _batch_executor
+    # Created on first use so each gunicorn worker gets its own threads
+    if _batch_executor is None:
+        _batch_executor = ThreadPoolExecutor(BATCH_CONCURRENCY, thread_name_prefix="batch")
+    return _batch_executor
+
+
+def batch_item(user_input, deadline, cached):
+    start = time.perf_counter()
+    if not isinstance(user_input, str):
+        mode, ai_msg, source, status = None, None, None, "invalid_input"
+    else:
+        try:
+            mode, ai_msg, source = generate_tip(user_input, deadline, cached.get, store=False)
+            status = source if source in ("fallback", "degraded") else "ok"
+        except Exception:
+            mode, ai_msg, source, status = None, upstream.ERROR_RESPONSE, "upstream", "error"
+    return {
+        "response": ai_msg,
+        "mode": mode,
+        "source": source,
+        "status": status,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
 
 
 @app.route("/healthtip", methods=["POST"])
 def health_tip():
     user_input = request.json.get("user_prompt", "")
 
-    if not user_input or user_input.strip() == "":
-        return jsonify({"response": "Please share your symptoms or your height and weight so I can help you better."}), 200
+    # Mode is exposed to callers and later stages as X-Tip-Mode
+    mode, ai_msg, _ = generate_tip(user_input)
 
-    final_prompt = COPSTAR_PROMPT + "\n\nUser Input: " + user_input.strip()
+    return jsonify({"response": ai_msg}), 200, {"X-Tip-Mode": mode}
 
-    payload = {
-        "model": "mistralai/mistral-large-2411",
-        "prompt": final_prompt,
-        "max_tokens": 220,
-        "temperature": 0.4
-    }
+
+def sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@app.route("/healthtip/stream", methods=["POST"])
+def health_tip_stream():
+    user_input = request.json.get("user_prompt", "")
+
+    result, tip = pipeline.local_answer(user_input)
+    if tip is None:
+        tip = pipeline.cached_answer(user_input)
+    if tip is None:
+        tip = pipeline.semantic_answer(user_input, result.mode)
+
+    def events():
+        if tip is not None:
+            for line in tip.split("\n"):
+                yield sse({"line": line})
+        else:
+            lines = []
+            deadline = Deadline()
+            pipeline.retries.start()
+            attempt = 1
+            while True:
+                try:
+                    with pipeline.upstream_call(result.mode) as model:
+                        payload = upstream.build_payload(user_input, model, result.mode)
+                        for line in upstream.stream_lines(payload, deadline):
+                            # Lines can't be repaired once sent, but intros,
+                            # closers and odd bullet markers can be fixed on the way
+                            if INVALID_RESPONSE in line:
+                                line = INVALID_RESPONSE
+                            else:
+                                line = output.normalize_line(line)
+                            if line is None:
+                                continue
+                            lines.append(line)
+                            yield sse({"line": line})
+                    break
+                except UPSTREAM_FAILURES as exc:
+                    # Only a stream that failed before its first line can
+                    # start over
+                    delay = None if lines else pipeline.retries.next_delay(attempt, exc, deadline.remaining())
+                    if delay is None:
+                        break
+                time.sleep(delay)
+                attempt += 1
+            if lines:
+                ai_msg = "\n".join(lines)
+                output.record(output.COMPLIANT if output.is_compliant(ai_msg) else output.FAILED)
+                pipeline.remember(user_input, ai_msg, result.mode)
+            # Lines already sent cannot be taken back, so only fall back
+            # when nothing arrived
+            if not lines:
+                for line in pipeline.fallback_answer(user_input, result).split("\n"):
+                    yield sse({"line": line})
+        yield sse({"mode": result.mode}, event="done")
 
     headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "X-Tip-Mode": result.mode
     }
+    return Response(events(), mimetype="text/event-stream", headers=headers)
 
-    response = requests.post(
-        "https://openrouter.ai/api/v1/chat/completions",
-        json=payload,
-        headers=headers
+
+@app.route("/healthtip/batch", methods=["POST"])
+def health_tip_batch():
+    user_prompts = request.json.get("user_prompts")
+
+    if not isinstance(user_prompts, list):
+        return jsonify({"error": "user_prompts must be a list"}), 400
+    if len(user_prompts) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} prompts per batch"}), 400
+
+    start = time.perf_counter()
+    # One cache round trip for every prompt that needs more than a local answer
+    cached = pipeline.cached_answers(
+        item for item in user_prompts
+        if isinstance(item, str) and pipeline.local_answer(item)[1] is None
     )
+    # map() keeps input order while the upstream calls overlap
+    deadline = Deadline()
+    results = list(get_batch_executor().map(lambda item: batch_item(item, deadline, cached), user_prompts))
+    # And one more for every new reply
+    pipeline.remember_many(
+        (user_input, result["response"], result["mode"])
+        for user_input, result in zip(user_prompts, results)
+        if result["source"] == "upstream" and result["status"] == "ok"
+    )
+
+    return jsonify({
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+    })
+
 
+@app.route("/bmi/bulk", methods=["POST"])
+def bmi_bulk():
+    # CSV in, CSV out; NDJSON in, NDJSON out. Results stream back a block
+    # at a time while the upload is still being read.
+    ndjson = request.mimetype in ("application/x-ndjson", "application/jsonl")
+    lines = bulk.read_lines(request.stream)
     try:
-        ai_msg = response.json()["choices"][0]["text"].strip()
-    except Exception:
-        ai_msg = "Unable to generate response."
+        columns, rows = (bulk.open_ndjson if ndjson else bulk.open_csv)(lines)
+    except bulk.BulkError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    blocks = bulk.results(columns, rows)
+    if ndjson:
+        return Response(stream_with_context(bulk.render_ndjson(blocks)), mimetype="application/x-ndjson")
+    return Response(stream_with_context(bulk.render_csv(blocks)), mimetype="text/csv")
+
+
+@app.route("/readyz", methods=["GET"])
+def readiness():
+    return jsonify(pipeline.readiness())
+
+
+@app.route("/admin/upstream", methods=["GET"])
+def upstream_stats():
+    stats = {
+        **upstream.stats(),
+        "singleflight": pipeline.flights.stats(),
+        "output": output.stats(),
+        "retries": pipeline.retries.stats()
+    }
+    if pipeline.micro_batcher is not None:
+        stats["microbatch"] = pipeline.micro_batcher.stats()
+    return jsonify(stats)
+
+
+@app.route("/admin/models", methods=["GET"])
+def model_stats():
+    return jsonify({**pipeline.model_router.stats(), "cascade": pipeline.cascade_stats()})
+
+
+@app.route("/admin/cache", methods=["GET"])
+def cache_stats():
+    return jsonify(pipeline.response_cache.stats())
+
+
+@app.route("/admin/cache", methods=["DELETE"])
+def cache_flush():
+    flushed = pipeline.response_cache.clear()
+    if pipeline.semantic_cache is not None:
+        flushed += pipeline.semantic_cache.clear()
+    return jsonify({"flushed": flushed})
 
-    # Clean unwanted tokens
-    ai_msg = ai_msg.replace("<s>", "").replace("</s>", "").strip()
 
-    return jsonify({"response": ai_msg})
+@app.route("/admin/semantic", methods=["GET"])
+def semantic_stats():
+    if pipeline.semantic_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **pipeline.semantic_cache.stats()})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,202 @@
+# Async serving mode for the same /healthtip contract as app.py.
+#
+#   uvicorn asgi:app --port 5000
+#   gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+#
+# The upstream completion is awaited on a shared httpx.AsyncClient, so a
+# single process can hold many requests in flight while OpenRouter works.
+#
+# The response cache may be a SQLite file or a Redis server, whose calls
+# block, so every cache call runs in a worker thread instead of on the
+# event loop.
+
+import asyncio
+import json
+import os
+
+import httpx
+
+import output
+import pipeline
+import upstream
+from breaker import CircuitOpenError
+from deadline import CONNECT_TIMEOUT_SECONDS, REQUEST_DEADLINE_SECONDS, Deadline, DeadlineExceeded
+
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "200"))
+ASYNC_MAX_KEEPALIVE = int(os.getenv("ASYNC_MAX_KEEPALIVE", "50"))
+
+_client = None
+_in_flight = {}
+
+# pipeline.retries with httpx transport errors in place of requests ones
+retries = pipeline.retry_policy((httpx.TransportError, upstream.UpstreamError))
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=upstream.HEADERS,
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_KEEPALIVE
+            ),
+            timeout=httpx.Timeout(REQUEST_DEADLINE_SECONDS, connect=CONNECT_TIMEOUT_SECONDS)
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_model(user_input, mode, tier, deadline):
+    # pipeline.retries.run() sleeps, so the loop is repeated here with an
+    # awaitable wait
+    retries.start()
+    attempt = 1
+    while True:
+        # The flight is shielded from its callers, so without this it would
+        # keep retrying after they had all fallen back
+        deadline.check()
+        remaining = deadline.remaining()
+        try:
+            with pipeline.upstream_call(mode, tier) as model:
+                response = await get_client().post(
+                    upstream.OPENROUTER_URL,
+                    json=upstream.build_payload(user_input, model, mode),
+                    timeout=httpx.Timeout(remaining, connect=min(CONNECT_TIMEOUT_SECONDS, remaining))
+                )
+                if response.status_code != 200:
+                    raise upstream.status_error(response)
+                ai_msg = upstream.extract_message(response)
+                if ai_msg == upstream.ERROR_RESPONSE:
+                    raise upstream.UpstreamError("Malformed completion")
+            return model, ai_msg
+        except Exception as exc:
+            delay = retries.next_delay(attempt, exc, deadline.remaining())
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def fetch_tip(user_input, mode):
+    deadline = Deadline()
+    attempts = pipeline.upstream_attempts(mode)
+    for index, tier in enumerate(attempts):
+        model, ai_msg = await fetch_model(user_input, mode, tier, deadline)
+        checked = output.repair(ai_msg)
+        output.record(checked.status)
+        if checked.status != output.FAILED or index == len(attempts) - 1:
+            if tier is not None:
+                pipeline.record_cascade(model, escalated=False)
+            break
+        if tier is not None:
+            pipeline.record_cascade(model, escalated=True)
+        output.record("retries")
+    await asyncio.to_thread(pipeline.remember, user_input, checked.text, mode)
+    return checked.text
+
+
+async def fetch_once(user_input, mode):
+    # Concurrent identical prompts on this event loop share one upstream call
+    key = pipeline.cache_key(user_input)
+    task = _in_flight.get(key)
+    if task is None:
+        task = _in_flight[key] = asyncio.ensure_future(fetch_tip(user_input, mode))
+
+        def finished(task):
+            _in_flight.pop(key, None)
+            # Every waiter may already have timed out; don't log it as lost
+            if not task.cancelled():
+                task.exception()
+
+        task.add_done_callback(finished)
+    # Shielded so one caller disconnecting does not cancel the others
+    return await asyncio.shield(task)
+
+
+async def health_tip(body):
+    user_input = body.get("user_prompt", "")
+
+    result, tip = pipeline.local_answer(user_input)
+    if tip is not None:
+        return 200, {"response": tip}, result.mode
+
+    ai_msg = await asyncio.to_thread(pipeline.cached_answer, user_input)
+    if ai_msg is None:
+        ai_msg = await asyncio.to_thread(pipeline.semantic_answer, user_input, result.mode)
+    if ai_msg is None:
+        try:
+            ai_msg = await asyncio.wait_for(fetch_once(user_input, result.mode), REQUEST_DEADLINE_SECONDS)
+        except (asyncio.TimeoutError, httpx.HTTPError, upstream.UpstreamError, CircuitOpenError, DeadlineExceeded):
+            ai_msg = await asyncio.to_thread(pipeline.fallback_answer, user_input, result)
+
+    return 200, {"response": ai_msg}, result.mode
+
+
+async def read_body(receive):
+    chunks = []
+    more = True
+    while more:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+async def send_json(send, status, data, headers=()):
+    body = json.dumps(data).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            *headers
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_client()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    if scope["path"] == "/readyz":
+        await send_json(send, 200, pipeline.readiness())
+        return
+    if scope["path"] != "/healthtip":
+        await send_json(send, 404, {"error": "Not found"})
+        return
+    if scope["method"] != "POST":
+        await send_json(send, 405, {"error": "Method not allowed"})
+        return
+
+    try:
+        body = json.loads(await read_body(receive))
+    except ValueError:
+        await send_json(send, 400, {"error": "Request body must be JSON"})
+        return
+    if not isinstance(body, dict):
+        await send_json(send, 400, {"error": "Request body must be a JSON object"})
+        return
+
+    status, data, mode = await health_tip(body)
+    await send_json(send, status, data, [(b"x-tip-mode", mode.encode("ascii"))])
@@ -0,0 +1,64 @@
+# Concurrent load generator for a running /healthtip server.
+#
+#   python bench.py http://127.0.0.1:5000/healthtip --requests 500 --concurrency 100
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def worker(client, url, prompt, queue, latencies, errors):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        try:
+            response = await client.post(url, json={"user_prompt": prompt})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            errors.append(time.perf_counter() - start)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(url, total, concurrency, prompt):
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            worker(client, url, prompt, queue, latencies, errors)
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+
+    print(f"requests:   {total} ({len(errors)} errors)")
+    print(f"elapsed:    {elapsed:.2f}s")
+    print(f"throughput: {total / elapsed:.1f} req/s")
+    for pct in (50, 90, 99):
+        print(f"p{pct}:        {percentile(latencies, pct) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--prompt", default="I have a fever")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.requests, args.concurrency, args.prompt))
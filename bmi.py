@@ -0,0 +1,59 @@
+# Local BMI MODE, following the rules in COPSTAR_PROMPT: BMI from height
+# and weight, rounded to 1 decimal, < 18.5 Low, 18.5-24.9 Normal, >= 25
+# High. Besides the prompt's cm/m and kg, measurements.py reads feet and
+# inches, pounds and stone.
+
+import math
+
+# Labelled numbers without units are a guess, left to the model
+MIN_CONFIDENCE = 0.8
+
+# Category boundaries from COPSTAR_PROMPT, on the rounded value
+NORMAL_FROM = 18.5
+HIGH_FROM = 25.0
+
+TIPS = {
+    "Low": [
+        "- Your BMI is {bmi}, which is in the Low category; aim to gain weight gradually with regular, nutrient-rich meals.",
+        "- Include protein, whole grains, healthy fats, and dairy or fortified alternatives in each meal.",
+        "- Add light strength exercises a few times a week to help build healthy muscle.",
+        "- Speak with your doctor if you have unintended weight loss, low appetite, or ongoing tiredness."
+    ],
+    "Normal": [
+        "- Your BMI is {bmi}, which is in the Normal category; focus on maintaining your current weight.",
+        "- Keep a balanced diet with vegetables, fruits, whole grains, and lean proteins.",
+        "- Stay active with at least 150 minutes of moderate activity each week.",
+        "- Continue routine check-ups with your doctor to keep track of your overall health."
+    ],
+    "High": [
+        "- Your BMI is {bmi}, which is in the High category; aim to reduce weight gradually and steadily.",
+        "- Choose smaller portions and limit sugary drinks, fried foods, and processed snacks.",
+        "- Build up to at least 150 minutes of moderate activity, such as brisk walking, each week.",
+        "- Talk with your doctor about a safe weight-management plan that suits your needs."
+    ]
+}
+
+
+def usable(found):
+    # (height_m, weight_kg) from measurements.parse() when both are there
+    # and certain enough to compute BMI from, else None
+    if found.height_m is None or found.weight_kg is None or found.confidence < MIN_CONFIDENCE:
+        return None
+    return found.height_m, found.weight_kg
+
+
+def compute(height_m, weight_kg):
+    # Round half up, as "round to 1 decimal" reads; round() would bank
+    value = math.floor(weight_kg / (height_m ** 2) * 10 + 0.5) / 10
+    if value < NORMAL_FROM:
+        category = "Low"
+    elif value < HIGH_FROM:
+        category = "Normal"
+    else:
+        category = "High"
+    return value, category
+
+
+def format_tip(value, category):
+    return "\n".join(TIPS[category]).format(bmi=f"{value:.1f}")
+
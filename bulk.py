@@ -0,0 +1,260 @@
+# BMI for whole rosters: a CSV or NDJSON upload of heights and weights in,
+# one result per row out, with no model calls.
+#
+# The upload is read in fixed-size chunks and handled a block of rows at a
+# time, so memory stays flat however large it is. Each block's BMI and
+# category are computed as NumPy array operations when NumPy is installed,
+# else row by row with bmi.compute(), which gives the same numbers.
+#
+# Columns (CSV header names or NDJSON keys) carry the unit: height_cm,
+# height_m, height_in, weight_kg, weight_lb. Plain "height" is read as cm
+# above 2.5 and meters below; plain "weight" as kg. An "id" column is
+# passed through. Rows are numbered from 1 in the output.
+
+import codecs
+import csv
+import itertools
+import json
+import math
+import re
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # optional; falls back to bmi.compute() per row
+    np = None
+
+import bmi
+from measurements import INCH_M, MAX_HEIGHT_M, MAX_WEIGHT_KG, MIN_HEIGHT_M, MIN_WEIGHT_KG, POUND_KG
+
+CHUNK_BYTES = 64 * 1024
+MAX_LINE_BYTES = 64 * 1024
+BLOCK_ROWS = 4096
+
+# Column name -> factor to meters or kilograms; None means "guess per value"
+HEIGHT_COLUMNS = {"height_cm": 0.01, "height_m": 1.0, "height_in": INCH_M, "height": None}
+WEIGHT_COLUMNS = {"weight_kg": 1.0, "weight_lb": POUND_KG, "weight_lbs": POUND_KG, "weight": 1.0}
+
+LINE_BREAK_RE = re.compile(r"\r\n|\r|\n")
+# CSV fields holding these need quoting
+QUOTE_RE = re.compile(r'[,"\r\n]')
+
+Columns = namedtuple("Columns", ["id", "height", "height_factor", "weight", "weight_factor"])
+
+
+class BulkError(Exception):
+    pass
+
+
+def read_lines(stream, chunk_bytes=CHUNK_BYTES, max_line_bytes=MAX_LINE_BYTES):
+    # Decoded lines from a binary stream, without holding more than one
+    # chunk plus a partial line. "\n", "\r\n" and a bare "\r" (old Mac
+    # Excel exports) all end a line. A line longer than max_line_bytes is
+    # yielded as None and the rest of it skipped, so it is never held whole.
+    pending = b""
+    skipping = False
+    first = True
+    while True:
+        chunk = stream.read(chunk_bytes)
+        if not chunk:
+            break
+        if first:
+            chunk = chunk.removeprefix(codecs.BOM_UTF8)
+            first = False
+        data = pending + chunk
+        end = max(data.rfind(b"\n"), data.rfind(b"\r")) + 1
+        complete, pending = data[:end], data[end:]
+        if complete:
+            # Splitting on a line break byte never cuts a UTF-8 character.
+            # Bytes that are not UTF-8 become U+FFFD, so the row they are in
+            # fails to parse and gets an error like any other bad row.
+            for line in LINE_BREAK_RE.split(complete.decode("utf-8", errors="replace"))[:-1]:
+                if skipping:
+                    # The end of an overlong line
+                    skipping = False
+                    continue
+                yield line
+        if len(pending) > max_line_bytes:
+            if not skipping:
+                yield None
+                skipping = True
+            pending = b""
+    if pending.strip() and not skipping:
+        yield pending.decode("utf-8", errors="replace")
+
+
+def find_columns(names):
+    # Columns for a CSV header or the keys of the first NDJSON record
+    lowered = [name.strip().lower() for name in names]
+    height = next((name for name in HEIGHT_COLUMNS if name in lowered), None)
+    weight = next((name for name in WEIGHT_COLUMNS if name in lowered), None)
+    if height is None or weight is None:
+        raise BulkError(
+            f"Need a height column ({', '.join(HEIGHT_COLUMNS)}) "
+            f"and a weight column ({', '.join(WEIGHT_COLUMNS)})"
+        )
+    return Columns(
+        lowered.index("id") if "id" in lowered else None,
+        lowered.index(height), HEIGHT_COLUMNS[height],
+        lowered.index(weight), WEIGHT_COLUMNS[weight]
+    )
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _csv_fields(line):
+    # Each line is parsed on its own, so a stray quote only spoils its own
+    # row instead of swallowing the rest of the upload. Quoted fields
+    # cannot span lines.
+    if line is None:
+        return None
+    if '"' not in line:
+        return line.split(",")
+    try:
+        return next(csv.reader([line], strict=True), None)
+    except csv.Error:
+        return None
+
+
+def open_csv(lines):
+    # (columns, rows) where rows yields (id, height, weight) as given. The
+    # header is read here, so a bad one fails before any output is sent.
+    lines = (line for line in lines if line is None or line.strip())
+    header = _csv_fields(next(lines, None))
+    if header is None:
+        raise BulkError("Empty upload or unreadable header")
+    columns = find_columns(header)
+
+    def field(fields, index):
+        return fields[index] if index is not None and index < len(fields) else None
+
+    def rows():
+        for line in lines:
+            fields = _csv_fields(line)
+            if fields is None:
+                yield None, None, None
+                continue
+            yield field(fields, columns.id), field(fields, columns.height), field(fields, columns.weight)
+
+    return columns, rows()
+
+
+def open_ndjson(lines):
+    # Like open_csv; the first record's keys pick the columns
+    lines = (line for line in lines if line is None or line.strip())
+    first = next(lines, None)
+    if first is None:
+        raise BulkError("Empty upload or unreadable first record")
+    try:
+        record = json.loads(first)
+    except (TypeError, ValueError):
+        record = None
+    if not isinstance(record, dict):
+        raise BulkError("Each line must be a JSON object")
+    names = list(record)
+    columns = find_columns(names)
+    keys = [names[index] if index is not None else None for index in (columns.id, columns.height, columns.weight)]
+
+    def rows():
+        for line in itertools.chain([first], lines):
+            try:
+                record = json.loads(line)
+            except (TypeError, ValueError):
+                record = None
+            if not isinstance(record, dict):
+                yield None, None, None
+                continue
+            yield tuple(record.get(key) if key is not None else None for key in keys)
+
+    return columns, rows()
+
+
+def compute(heights, weights, height_factor, weight_factor):
+    # (bmi values, categories) for one block; rows that are missing,
+    # unreadable or implausible get None for both
+    if np is None:
+        results = []
+        for height, weight in zip(heights, weights):
+            height = _float(height)
+            if height_factor is not None:
+                height *= height_factor
+            elif height > MAX_HEIGHT_M:
+                height /= 100
+            weight = _float(weight) * weight_factor
+            if MIN_HEIGHT_M <= height <= MAX_HEIGHT_M and MIN_WEIGHT_KG <= weight <= MAX_WEIGHT_KG:
+                results.append(bmi.compute(height, weight))
+            else:
+                results.append((None, None))
+        return [value for value, _ in results], [category for _, category in results]
+
+    height = np.array([_float(value) for value in heights], dtype=np.float64)
+    weight = np.array([_float(value) for value in weights], dtype=np.float64) * weight_factor
+    if height_factor is not None:
+        height *= height_factor
+    else:
+        height = np.where(height > MAX_HEIGHT_M, height / 100, height)
+    # NaN fails every comparison, so unreadable values drop out here too
+    valid = (height >= MIN_HEIGHT_M) & (height <= MAX_HEIGHT_M) & (weight >= MIN_WEIGHT_KG) & (weight <= MAX_WEIGHT_KG)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Same operations as bmi.compute(), so the same rounding
+        value = np.floor(weight / (height ** 2) * 10 + 0.5) / 10
+    category = np.where(value < bmi.NORMAL_FROM, "Low", np.where(value < bmi.HIGH_FROM, "Normal", "High"))
+    values = [float(item) if ok else None for item, ok in zip(value, valid)]
+    categories = [str(item) if ok else None for item, ok in zip(category, valid)]
+    return values, categories
+
+
+def results(columns, rows, block_rows=BLOCK_ROWS):
+    # Yields lists of result dicts, one list per block
+    block = []
+    number = 0
+    for row in rows:
+        block.append(row)
+        if len(block) == block_rows:
+            yield _block_results(block, number, columns)
+            number += len(block)
+            block = []
+    if block:
+        yield _block_results(block, number, columns)
+
+
+def _block_results(block, first, columns):
+    values, categories = compute(
+        [row[1] for row in block],
+        [row[2] for row in block],
+        columns.height_factor,
+        columns.weight_factor
+    )
+    return [
+        {"row": first + index + 1, "id": row[0], "bmi": value, "category": category}
+        if value is not None else
+        {"row": first + index + 1, "id": row[0], "error": "invalid height or weight"}
+        for index, (row, value, category) in enumerate(zip(block, values, categories))
+    ]
+
+
+def render_csv(blocks):
+    yield "row,id,bmi,category,error\r\n"
+    for block in blocks:
+        lines = []
+        for result in block:
+            item_id = result["id"]
+            if item_id is None:
+                item_id = ""
+            elif QUOTE_RE.search(str(item_id)):
+                item_id = '"' + str(item_id).replace('"', '""') + '"'
+            if "error" in result:
+                lines.append(f"{result['row']},{item_id},,,{result['error']}\r\n")
+            else:
+                lines.append(f"{result['row']},{item_id},{result['bmi']:.1f},{result['category']},\r\n")
+        yield "".join(lines)
+
+
+def render_ndjson(blocks):
+    for block in blocks:
+        yield "".join(json.dumps(result) + "\n" for result in block)
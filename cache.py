@@ -0,0 +1,460 @@
+import hashlib
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+from resp import RedisError
+
+SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(user_input):
+    text = unicodedata.normalize("NFKC", user_input).lower()
+    text = SPACE_RE.sub(" ", text).strip()
+    # "I have a fever." and "i have a fever" are the same question
+    return text.rstrip(".!?").strip()
+
+
+def make_key(user_input, *parts):
+    raw = "\x1f".join([normalize(user_input)] + [str(part) for part in parts])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CacheBackend:
+    # What the pipeline needs from a response cache. get() misses on expired
+    # entries, get_stale() still returns them for degraded answers. Backends
+    # with a round trip per call override the *_many methods.
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def get_stale(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def set_many(self, items):
+        for key, value in items:
+            self.set(key, value)
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    # Bounded mapping with least-recently-used eviction and a per-entry TTL
+
+    def __init__(self, max_entries=2048, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                # Expired entries stay until evicted, for get_stale()
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key):
+        # Last known value even if past its TTL, for degraded answers
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[0] if entry is not None else None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            flushed = len(self._data)
+            self._data.clear()
+        return flushed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+class SQLiteCache(CacheBackend):
+    # The same interface as LRUCache, kept in a SQLite file in WAL mode so
+    # every gunicorn worker on the machine shares one cache, and a recycled
+    # worker starts warm. Eviction is least recently used across workers.
+    #
+    # Like RedisCache, a locked or broken file must not fail requests:
+    # errors count as misses, and writes that fail are dropped. The busy
+    # timeout is short for the same reason.
+
+    # A hit only records its use when the last record is older than this,
+    # so most reads stay reads and do not queue for the write lock
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path, max_entries=2048, ttl=3600, timeout=0.25):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+        self._ready = False
+        self._create()
+
+    def _create(self):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "expires_at REAL NOT NULL, used_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)")
+        except sqlite3.Error:
+            self._count("errors")
+            return False
+        self._ready = True
+        return True
+
+    def _connect(self):
+        # One connection per thread, opened again after a fork: SQLite
+        # connections must not cross a fork. Counters restart with the worker.
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._local = threading.local()
+                    self.hits = self.misses = self.evictions = self.expirations = self.errors = 0
+                    self._pid = pid
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL keeps the file consistent without an fsync per write; a
+            # power cut may lose the newest entries, which is fine for a cache
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _execute(self, sql, parameters=()):
+        # Cursor for sql, or None when the database could not be used
+        if not self._ready and not self._create():
+            return None
+        try:
+            return self._connect().execute(sql, parameters)
+        except sqlite3.Error:
+            self._count("errors")
+            return None
+
+    def get(self, key):
+        cursor = self._execute("SELECT value, expires_at, used_at FROM entries WHERE key = ?", (key,))
+        row = cursor.fetchone() if cursor is not None else None
+        if row is None:
+            self._count("misses")
+            return None
+        value, expires_at, used_at = row
+        now = time.time()
+        if expires_at <= now:
+            self._count("expirations")
+            self._count("misses")
+            return None
+        if now - used_at > self.TOUCH_INTERVAL:
+            # Best effort: a failed touch only makes eviction less exact
+            self._execute("UPDATE entries SET used_at = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return value
+
+    def get_stale(self, key):
+        cursor = self._execute("SELECT value FROM entries WHERE key = ?", (key,))
+        row = cursor.fetchone() if cursor is not None else None
+        return row[0] if row is not None else None
+
+    def set(self, key, value):
+        if not self._ready and not self._create():
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now + self.ttl, now)
+                )
+                evicted = conn.execute(
+                    "DELETE FROM entries WHERE key IN ("
+                    "SELECT key FROM entries ORDER BY used_at "
+                    "LIMIT max((SELECT count(*) FROM entries) - ?, 0))",
+                    (self.max_entries,)
+                ).rowcount
+        except sqlite3.Error:
+            self._count("errors")
+            return
+        if evicted:
+            self._count("evictions", evicted)
+
+    def clear(self):
+        if not self._ready and not self._create():
+            return 0
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                return conn.execute("DELETE FROM entries").rowcount
+        except sqlite3.Error:
+            self._count("errors")
+            return 0
+
+    def stats(self):
+        cursor = self._execute("SELECT count(*) FROM entries")
+        row = cursor.fetchone() if cursor is not None else None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                "entries": row[0] if row is not None else None,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "errors": self.errors,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+class RedisCache(CacheBackend):
+    # Shared by every instance of the app through a Redis-protocol server.
+    # Values are stored zlib-compressed behind their expiry time, and kept
+    # on the server for stale_ttl past it so get_stale() still finds them.
+    # Size is bounded by the server (maxmemory with an LRU policy), not here.
+    #
+    # A cache that is down must not fail requests: errors count as misses.
+
+    def __init__(self, client, ttl=3600, stale_ttl=86400, prefix="healthtip:"):
+        self.client = client
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.errors = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _encode(self, value):
+        raw = value.encode("utf-8")
+        data = struct.pack("!d", time.time() + self.ttl) + zlib.compress(raw)
+        with self._lock:
+            self.raw_bytes += len(raw)
+            self.stored_bytes += len(data)
+        return data
+
+    @staticmethod
+    def _decode(data):
+        # (value, expires_at)
+        return zlib.decompress(data[8:]).decode("utf-8"), struct.unpack("!d", data[:8])[0]
+
+    def _run(self, commands):
+        try:
+            replies = self.client.pipeline(commands)
+        except (OSError, RedisError):
+            self._count("errors")
+            return None
+        if any(isinstance(reply, RedisError) for reply in replies):
+            self._count("errors")
+            return None
+        return replies
+
+    def get_many(self, keys):
+        replies = self._run([("GET", self.prefix + key) for key in keys])
+        if replies is None:
+            self._count("misses", len(keys))
+            return [None] * len(keys)
+        now = time.time()
+        values = []
+        for data in replies:
+            value = None
+            if data is not None:
+                try:
+                    value, expires_at = self._decode(data)
+                except (zlib.error, struct.error, UnicodeDecodeError):
+                    self._count("errors")
+                else:
+                    if expires_at <= now:
+                        self._count("expirations")
+                        value = None
+            self._count("hits" if value is not None else "misses")
+            values.append(value)
+        return values
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_stale(self, key):
+        replies = self._run([("GET", self.prefix + key)])
+        if not replies or replies[0] is None:
+            return None
+        try:
+            return self._decode(replies[0])[0]
+        except (zlib.error, struct.error, UnicodeDecodeError):
+            return None
+
+    def set_many(self, items):
+        expiry = int(self.ttl + self.stale_ttl)
+        self._run([("SET", self.prefix + key, self._encode(value), "EX", expiry) for key, value in items])
+
+    def set(self, key, value):
+        self.set_many([(key, value)])
+
+    def _keys(self):
+        cursor = b"0"
+        while True:
+            cursor, keys = self.client.execute("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500)
+            yield keys
+            if cursor == b"0":
+                return
+
+    def clear(self):
+        flushed = 0
+        try:
+            for keys in self._keys():
+                if keys:
+                    flushed += self.client.execute("DEL", *keys)
+        except (OSError, RedisError):
+            self._count("errors")
+        return flushed
+
+    def stats(self):
+        try:
+            entries = sum(len(keys) for keys in self._keys())
+        except (OSError, RedisError):
+            self._count("errors")
+            entries = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "redis",
+                "server": f"{self.client.host}:{self.client.port}/{self.client.db}",
+                "entries": entries,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "errors": self.errors,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "compression_ratio": round(self.stored_bytes / self.raw_bytes, 3) if self.raw_bytes else 0.0
+            }
+
+
+class Metered(CacheBackend):
+    # Times every call into a backend, so /admin/cache shows what each
+    # backend costs per lookup next to its hit ratio
+
+    OPERATIONS = ("get", "get_many", "get_stale", "set", "set_many", "clear")
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._latency = {name: [0, 0.0, 0.0] for name in self.OPERATIONS}
+
+    def _timed(self, name, *args):
+        start = time.perf_counter()
+        try:
+            return getattr(self.backend, name)(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                entry = self._latency[name]
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2] = max(entry[2], elapsed)
+
+    def get(self, key):
+        return self._timed("get", key)
+
+    def get_many(self, keys):
+        return self._timed("get_many", keys)
+
+    def get_stale(self, key):
+        return self._timed("get_stale", key)
+
+    def set(self, key, value):
+        return self._timed("set", key, value)
+
+    def set_many(self, items):
+        return self._timed("set_many", items)
+
+    def clear(self):
+        return self._timed("clear")
+
+    def stats(self):
+        with self._lock:
+            latency = {
+                name: {
+                    "calls": calls,
+                    "mean_ms": round(total / calls * 1000, 3),
+                    "max_ms": round(longest * 1000, 3)
+                }
+                for name, (calls, total, longest) in self._latency.items()
+                if calls
+            }
+        return {**self.backend.stats(), "latency": latency}
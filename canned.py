@@ -0,0 +1,9 @@
+# Pre-approved replies used when the upstream model cannot answer in time.
+# They follow the SYMPTOM MODE format rules from COPSTAR_PROMPT.
+
+GENERAL_TIPS = "\n".join([
+    "- Rest well and avoid strenuous activity until you feel better.",
+    "- Drink water regularly and eat light, balanced meals.",
+    "- Keep track of your symptoms and note any changes.",
+    "- Contact your doctor if symptoms worsen, persist, or concern you."
+])
@@ -0,0 +1,79 @@
+# Local version of the MODE CLASSIFICATION RULES in COPSTAR_PROMPT.
+#
+# BMI and INVALID are only reported as confident when the rules settle it
+# without judgement: both measurements parsed, or a message that is only a
+# greeting or clearly off-topic. No word list covers every health term, so
+# anything else, however short, is left for the model to decide.
+
+import re
+from collections import namedtuple
+
+import bmi
+import measurements
+
+BMI = "BMI"
+SYMPTOM = "SYMPTOM"
+INVALID = "INVALID"
+
+Classification = namedtuple("Classification", ["mode", "confident", "measurements"])
+
+# Word prefixes, so "coughing", "aches" and "vomited" all count
+HEALTH_STEMS = [
+    # symptoms
+    "fever", "feverish", "temperature", "cough", "headache", "migraine", "nause", "vomit",
+    "pain", "ache", "aching", "hurt", "sore", "cramp", "dizz", "faint", "tired", "fatigue",
+    "exhaust", "weak", "cold", "flu", "chill", "sneez", "congest", "runny", "rash", "itch",
+    "swell", "swollen", "bleed", "blood", "diarrh", "constipat", "bloat", "indigest",
+    "heartburn", "acid", "breath", "wheez", "insomnia", "sleep", "anxi", "stress",
+    "depress", "sick", "ill", "unwell", "infect", "allerg", "injur", "sprain", "burn",
+    "numb", "tingl", "palpitat", "pressure", "sugar", "diabet", "cholesterol",
+    # body
+    "head", "stomach", "tummy", "belly", "back", "chest", "throat", "ear", "eye", "nose",
+    "tooth", "teeth", "joint", "knee", "neck", "shoulder", "muscle", "skin", "heart",
+    "lung", "leg", "arm", "foot", "feet",
+    # goals and general health
+    "health", "weight", "weigh", "height", "tall", "bmi", "diet", "lose", "gain", "fat",
+    "obes", "overweight", "underweight", "thin", "exercis", "workout", "fitness", "fit",
+    "eat", "appetite", "meal", "nutrition", "hydrat", "doctor", "medic", "symptom",
+    "feel", "kg", "kilo", "lb", "pound", "cm"
+]
+
+# Topics that are never health questions. Whole words, not stems: "code"
+# must not match "codeine", nor "stock" "stockings".
+OFF_TOPIC_WORDS = [
+    "weather", "forecasts?", "news", "movies?", "films?", "songs?", "music", "jokes?", "games?",
+    "football", "cricket", "scores?", "stocks?", "bitcoin", "crypto", "code", "coding", "python",
+    "javascript", "translate", "translation", "capital", "president", "elections?", "homework"
+]
+
+# A message made only of these words is small talk
+GREETING_WORDS = frozenset("""
+hi hello hey hiya heya yo hola namaste greetings good morning afternoon evening day night
+thanks thank you thx ty cheers ok okay bye goodbye see ya how are doing there what s up
+sup nice to meet
+""".split())
+
+HEALTH_RE = re.compile(r"\b(?:" + "|".join(HEALTH_STEMS) + r")", re.IGNORECASE)
+OFF_TOPIC_RE = re.compile(r"\b(?:" + "|".join(OFF_TOPIC_WORDS) + r")\b", re.IGNORECASE)
+DIGIT_RE = re.compile(r"\d")
+TOKEN_RE = re.compile(r"\w+")
+
+
+def classify(user_input):
+    found = measurements.parse(user_input)
+    pair = bmi.usable(found)
+    if pair is not None:
+        return Classification(BMI, True, pair)
+
+    # Only one measurement, or two the parser is unsure of
+    if HEALTH_RE.search(user_input) or found.spans:
+        return Classification(SYMPTOM, False, None)
+
+    # Bare numbers may be unlabelled measurements
+    if DIGIT_RE.search(user_input):
+        return Classification(INVALID, False, None)
+
+    tokens = TOKEN_RE.findall(user_input.lower())
+    greeting = bool(tokens) and all(token in GREETING_WORDS for token in tokens)
+    confident = greeting or OFF_TOPIC_RE.search(user_input) is not None
+    return Classification(INVALID, confident, None)
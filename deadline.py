@@ -0,0 +1,32 @@
+import os
+import time
+
+# End-to-end budget for one /healthtip request, upstream work included
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "10"))
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("CONNECT_TIMEOUT_SECONDS", "3"))
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+
+    def __init__(self, seconds=REQUEST_DEADLINE_SECONDS):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded()
+
+    def timeouts(self):
+        # (connect, read) for requests, both bounded by what is left
+        self.check()
+        remaining = self.remaining()
+        return min(CONNECT_TIMEOUT_SECONDS, remaining), remaining
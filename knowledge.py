@@ -0,0 +1,269 @@
+# Pre-approved SYMPTOM MODE tips for the symptoms users ask about most,
+# found with one Aho-Corasick pass over the input.
+#
+# Each entry has three care bullets and a closing "when to see a doctor"
+# bullet. Several symptoms in one message combine like this: entries are
+# ordered by priority (lower first, then by where they were mentioned),
+# the care bullets are taken round-robin across them until there are
+# three, and the most urgent entry's doctor bullet closes the reply.
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from spelling import TypoIndex
+from cache import normalize
+from matcher import KeywordMatcher
+from semantic import STOPWORDS
+
+Entry = namedtuple("Entry", ["symptom", "priority", "keywords", "tips"])
+Match = namedtuple("Match", ["symptoms", "reply", "covered", "red_flag"])
+
+ENTRIES = [
+    Entry("nausea", 1, ["nausea", "nauseous", "nauseated", "vomit*", "throwing up", "sick to my stomach"], [
+        "- Sip small amounts of water or clear fluids often to stay hydrated.",
+        "- Eat small, bland meals such as toast, rice or bananas when you feel able.",
+        "- Rest sitting up and avoid strong smells, greasy food and caffeine.",
+        "- Contact your doctor if you cannot keep fluids down, vomiting lasts more than a day, or you feel very weak."
+    ]),
+    Entry("diarrhea", 1, ["diarrhea", "diarrhoea", "loose motion*", "loose stool*"], [
+        "- Drink water and oral rehydration solution regularly to replace lost fluids.",
+        "- Eat small, bland meals and avoid dairy, fatty and spicy foods for now.",
+        "- Wash your hands often to avoid passing an infection on.",
+        "- Contact your doctor if it lasts more than two days, you see blood, or you feel dizzy or very thirsty."
+    ]),
+    Entry("dizziness", 1, ["dizzy", "dizziness", "lightheaded", "light headed", "vertigo"], [
+        "- Sit or lie down as soon as you feel dizzy, and get up slowly.",
+        "- Drink water regularly and avoid skipping meals.",
+        "- Avoid driving or climbing until the feeling has passed.",
+        "- Contact your doctor if dizziness keeps returning, or comes with fainting, chest pain or trouble speaking."
+    ]),
+    Entry("fever", 2, ["fever*", "high temperature", "feeling hot", "chills"], [
+        "- Rest as much as you can and avoid strenuous activity.",
+        "- Drink water and clear fluids regularly to stay hydrated.",
+        "- Wear light clothing and keep your room comfortably cool.",
+        "- Contact your doctor if the fever lasts more than three days, is very high, or comes with a rash or stiff neck."
+    ]),
+    Entry("headache", 3, ["headache*", "head ache*", "migraine*", "head hurts", "head is hurting"], [
+        "- Rest in a quiet, dim room and take short breaks from screens.",
+        "- Drink water regularly, as dehydration can trigger headaches.",
+        "- Keep regular meal and sleep times and limit caffeine.",
+        "- Contact your doctor if headaches are severe, sudden, frequent, or come with vision changes or confusion."
+    ]),
+    Entry("sore throat", 3, ["sore throat", "throat pain", "throat is sore", "scratchy throat"], [
+        "- Drink warm fluids such as water, soup or tea with honey.",
+        "- Gargle with warm salt water a few times a day.",
+        "- Rest your voice and avoid smoke and very dry air.",
+        "- Contact your doctor if it lasts more than a week or you have trouble swallowing."
+    ]),
+    Entry("cough", 3, ["cough*"], [
+        "- Drink warm fluids regularly to soothe your throat.",
+        "- Rest and avoid smoke, dust and other irritants.",
+        "- Use a humidifier or breathe in steam to ease congestion.",
+        "- Contact your doctor if the cough lasts more than three weeks or you cough up blood."
+    ]),
+    # Not bare "cold": "I'm cold" or "it is cold" is not a cold
+    Entry("cold", 4, ["a cold", "common cold", "head cold", "have cold", "has cold", "having cold", "runny nose", "blocked nose", "stuffy nose", "sneez*", "congest*"], [
+        "- Rest and keep warm while your body recovers.",
+        "- Drink plenty of fluids and eat light, nourishing meals.",
+        "- Use saline nose drops or steam to ease a blocked nose.",
+        "- Contact your doctor if symptoms last more than ten days or get worse after starting to improve."
+    ]),
+    Entry("fatigue", 4, ["tired", "tiredness", "fatigue*", "exhausted", "no energy", "low energy"], [
+        "- Aim for seven to nine hours of sleep at regular times.",
+        "- Eat balanced meals and drink water through the day.",
+        "- Add gentle daily activity such as a short walk.",
+        "- Contact your doctor if tiredness lasts more than a few weeks or affects your daily life."
+    ]),
+    Entry("pain", 4, ["pain", "pains", "painful", "ache", "aches", "aching", "hurt*", "sore"], [
+        "- Rest the painful area and avoid activities that make it worse.",
+        "- Apply a cold or warm compress for short periods to ease discomfort.",
+        "- Move gently as the pain allows to avoid stiffness.",
+        "- Contact your doctor if the pain is severe, keeps getting worse, or does not improve within a few days."
+    ]),
+    Entry("lose weight", 5, ["lose weight", "losing weight", "weight loss", "reduce weight", "slim down"], [
+        "- Fill half your plate with vegetables and choose whole grains and lean proteins.",
+        "- Aim for at least 150 minutes of moderate activity each week.",
+        "- Limit sugary drinks, snacks and large portions.",
+        "- Talk to your doctor before starting a new diet or exercise plan."
+    ]),
+    Entry("gain weight", 5, ["gain weight", "gaining weight", "put on weight", "weight gain", "bulk up"], [
+        "- Eat regular meals with an extra healthy snack, such as nuts or yogurt.",
+        "- Include protein-rich foods like eggs, beans, fish and dairy.",
+        "- Add strength exercises to build muscle, not just fat.",
+        "- Talk to your doctor if you are losing weight without trying."
+    ])
+]
+
+# Anything that could be serious goes to the model, however well the rest
+# of the message is covered
+RED_FLAGS = [
+    "chest*", "breath*", "blood*", "bleed*", "faint*", "unconscious", "seizure*", "stroke",
+    "pregnan*", "baby", "infant", "child*", "kid*", "suicid*", "overdose*", "severe", "worst",
+    "emergency", "heart*", "numb*", "paraly*", "confus*"
+]
+
+# Words that do not make a message more than its symptoms
+FILLER = STOPWORDS | frozenset("""
+bit little lot lots mild slight slightly bad terrible awful keep keeps keeping kind
+sort since day days night morning evening week yesterday want wants need needs
+try trying
+""".split())
+
+TOKEN_RE = re.compile(r"\w+")
+CARE_BULLETS = 3
+
+# "no fever", "I don't have a headache": a symptom named just before one
+# of these, in the same clause, is one the user does not have
+NEGATION_RE = re.compile(
+    r"\b(?:no|not|never|without|nor|neither|none|dont|doesnt|didnt|havent|hasnt|isnt|arent|wasnt|cant)\b|n[’']t\b"
+)
+CLAUSE_RE = re.compile(r"[.,;:!?]|\b(?:but|and|though|although|however)\b")
+NEGATION_WINDOW = 4
+
+# More symptom and body words for typo correction, beyond the keywords
+EXTRA_TERMS = """
+vomiting coughing aching hurting nauseous stomach stomachache tummy belly throat temperature feverish
+headaches migraine dizziness diarrhea diarrhoea constipation cramps cramping
+sneezing congestion shivering sweating fatigue tiredness exhausted weakness
+itching itchy swelling swollen rash allergy allergies infection insomnia sleep
+anxiety stress sprain injury muscle joint shoulder knee ankle back neck weight
+height pounds kilograms centimeters inches stone stones feet foot kilos metres meters
+""".split()
+
+# Real English words one edit from a vocabulary term with the same first
+# letter ("couch" / "cough", "tires" / "tired"), which must never be
+# "corrected". Taken from the wordfreq English list (Zipf frequency 2 and
+# up, five letters and longer); regenerate it when the vocabulary changes:
+#
+#   [word for word in wordfreq.top_n_list("en", 200000)
+#    if word.isalpha() and len(word) >= MIN_TYPO_LENGTH and word not in VOCABULARY
+#    and wordfreq.zipf_frequency(word, "en") >= 2
+#    and any(term[0] == word[0] for _, term in _terms.search(word, 1))]
+KNOWN_WORDS = frozenset("""
+acces ached acing acres actes acting angle ankles anklet arche arches arching ashes babby babys
+backs bagby bally baulk belay bella belle belli bello bells billy black blacked bleeds bleek bleep
+blend blocker blond bloods bloody bloom bloop bloor blued brack breach breadth breathe breaths
+breathy breed brood bulky bully camping camps centimeter champs cheat chert chess chests chesty
+childe childs chile chiles chili chilis chill chilli chilly clamping clamps clever clough colder
+colds comeon commons commun comon confuse contest conus couch cough coughs could cramming cramp
+crapping craps crest crimping ditzy dough downe downs downy drown eight emergence faint faints
+fatigued fatigues feder feeding feelin feelings feets feint felling feuer fevers fewer fiver fleet
+flint folder foote foots footy froot fueling gains gainz garin gavin grain haigh haight halve
+halving haring harts hating haveing havel haven haver haves havin havre hazing header headey heads
+heady heald healed heaped heard heared hearn hears hearst hearth hearts hearty heated heave heaved
+heaving heeded heigh heights herded herts highs hight holder hunting hunts hurling hurls hurst
+hurtin hurtling inched inching infact infanta infante infants infections inflection injection injure
+insomniac itches joins joints joist kalos kills kilns kilogram kilts kneed kneel knees lasing lever
+licht lights loess loosed loosen looser looses loosing loring loser loses losin lossy louse loving
+lowing meares meteors meter metre metros meyers migraines motions muscled muscles nauseam necks
+never noise noose norse nosed noses nosey numbs overdone overdosed overdoses pails paine paint
+paints pairs palin partly pawns payin plain plains point ponds pound pregnant prins rasch rashi
+reduced reducer reduces renny ronny rough saint salim scone scones score scratch seating seizures
+selim selling sever severa severed severn severs sheep shelling shone shore should shoulders sicko
+skool sleek sleep sleeps sleepy sleet slick slime slims slimy smelling sneed sneer sneering sneeze
+snelling snore sobre sorel soren sores spain spelling spool spore sprains steep stick stine stoke
+stokes stole stoll stomachs stoned stoner stoners stoney stony stood stools stoop stopes store
+stores stove stoves stowe strain strike strobe strode stroked strokes strove stuff stuffs suicide
+swearing sweep sweeting swellings swilling swore tammy temperatures though threat throats throaty
+throwin tiered tiled timed timmy tires tommy tough vomits weigh weighs weights weighty wight worse
+would wright wurst
+""".split())
+
+# Shorter tokens are left alone: too many real words sit one edit away
+MIN_TYPO_LENGTH = 5
+
+_matcher = KeywordMatcher(
+    [(keyword, ("entry", entry)) for entry in ENTRIES for keyword in entry.keywords]
+    + [(keyword, ("red_flag", None)) for keyword in RED_FLAGS]
+)
+
+
+def vocabulary():
+    words = set(EXTRA_TERMS)
+    for keyword in [keyword for entry in ENTRIES for keyword in entry.keywords] + RED_FLAGS:
+        words.update(keyword.rstrip("*").split())
+    return sorted(word for word in words if len(word) >= 4)
+
+
+VOCABULARY = frozenset(vocabulary())
+_terms = TypoIndex(VOCABULARY)
+
+
+@lru_cache(maxsize=4096)
+def correct_word(word):
+    # The vocabulary term word is a typo of, or word itself
+    if len(word) < MIN_TYPO_LENGTH or word in VOCABULARY or word in FILLER or word in KNOWN_WORDS:
+        return word
+    if not word.isalpha():
+        return word
+    # Only single edits: two edits away, real words outnumber typos
+    found = _terms.search(word, 1)
+    # Typos rarely hit the first letter, and allowing them there turns real
+    # words into symptoms ("painting" / "gaining")
+    found = [(distance, term) for distance, term in found if term[0] == word[0]]
+    # A tie between two terms is a guess, not a correction
+    if not found or (len(found) > 1 and found[0][0] == found[1][0]):
+        return word
+    return found[0][1]
+
+
+def correct(user_input):
+    # "hedache and feaver" -> "headache and fever"
+    text = normalize(user_input)
+    return TOKEN_RE.sub(lambda match: correct_word(match.group()), text)
+
+
+def combine(entries):
+    care = []
+    for index in range(CARE_BULLETS):
+        for entry in entries:
+            tip = entry.tips[index]
+            if len(care) < CARE_BULLETS and tip not in care:
+                care.append(tip)
+    return "\n".join(care + [entries[0].tips[-1]])
+
+
+def negated(text, start):
+    # Whether a negation comes shortly before start, in the same clause
+    clause = CLAUSE_RE.split(text[:start])[-1]
+    window = " ".join(clause.split()[-NEGATION_WINDOW:])
+    return NEGATION_RE.search(window) is not None
+
+
+def lookup(user_input):
+    # Match for the symptoms in user_input, or None when there are none.
+    # Negated symptoms ("no fever") are left out. covered means the
+    # symptoms are all there is to the message: no numbers, no red flags,
+    # no negations and nothing but filler left over, so the reply can
+    # stand in for the model's.
+    text = normalize(user_input)
+    matches = list(_matcher.search(text))
+    # "sore throat" is one symptom, not a sore throat plus some pain
+    matches = [
+        (start, end, value) for start, end, value in matches
+        if not any(
+            other_start <= start and end <= other_end and (other_start, other_end) != (start, end)
+            for other_start, other_end, _ in matches
+        )
+    ]
+    found = {}
+    red_flag = False
+    negation = False
+    for start, _, (kind, entry) in matches:
+        if kind == "red_flag":
+            red_flag = True
+        elif negated(text, start):
+            negation = True
+        elif entry.symptom not in found:
+            found[entry.symptom] = (entry, start)
+    if not found:
+        return None
+
+    entries = [entry for entry, _ in sorted(found.values(), key=lambda item: (item[0].priority, item[1]))]
+    leftover = [
+        match.group() for match in TOKEN_RE.finditer(text)
+        if not any(start <= match.start() and match.end() <= end for start, end, _ in matches)
+    ]
+    covered = not red_flag and not negation and all(word in FILLER for word in leftover)
+    return Match([entry.symptom for entry in entries], combine(entries), covered, red_flag)
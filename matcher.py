@@ -0,0 +1,64 @@
+# Aho-Corasick automaton: finds every occurrence of any of a set of
+# keywords in one pass over the text, however many keywords there are.
+#
+# Keywords match whole words. A trailing "*" makes a keyword a stem, so
+# "cough*" also matches "coughs" and "coughing".
+
+
+class KeywordMatcher:
+
+    def __init__(self, keywords):
+        # keywords: iterable of (keyword, value); search() reports the value
+        self._goto = [{}]
+        self._fail = [0]
+        # Per node: (length, is_stem, value) of each keyword ending there
+        self._out = [[]]
+        for keyword, value in keywords:
+            stem = keyword.endswith("*")
+            keyword = keyword.rstrip("*").lower()
+            node = 0
+            for char in keyword:
+                following = self._goto[node].get(char)
+                if following is None:
+                    following = len(self._goto)
+                    self._goto[node][char] = following
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = following
+            self._out[node].append((len(keyword), stem, value))
+        self._link()
+
+    def _link(self):
+        # Breadth first, so a node's fail target is always linked before it
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, following in self._goto[node].items():
+                queue.append(following)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[following] = target if target != following else 0
+                self._out[following] = self._out[following] + self._out[self._fail[following]]
+
+    def search(self, text):
+        # Yields (start, end, value) for each whole-word match in text,
+        # which should already be lower case
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, stem, value in self._out[node]:
+                start = index + 1 - length
+                end = index + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if end < len(text) and text[end].isalnum():
+                    if not stem:
+                        continue
+                    # A stem claims the rest of the word
+                    while end < len(text) and text[end].isalnum():
+                        end += 1
+                yield start, end, value
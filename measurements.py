@@ -0,0 +1,113 @@
+# Height and weight in free text, in any of the usual units, normalized to
+# meters and kilograms: "175 cm", "1.75m", "1m75", "5'9\"", "5 ft 9 in",
+# "69 inches", "70 kg", "154 lbs", "11 st 4 lb". All of them are one
+# compiled pattern, so a message is scanned once.
+#
+# Numbers only labelled by a word ("height 175, weight 70") are read as
+# cm/kg (or m) with lower confidence, as the unit is a guess.
+
+import re
+from collections import namedtuple
+
+FOOT_M = 0.3048
+INCH_M = 0.0254
+POUND_KG = 0.45359237
+STONE_KG = 6.35029318
+
+# Values outside these ranges are more likely a parsing mistake than a
+# real measurement
+MIN_HEIGHT_M, MAX_HEIGHT_M = 0.5, 2.5
+MIN_WEIGHT_KG, MAX_WEIGHT_KG = 20.0, 350.0
+
+EXPLICIT = 1.0
+LABELLED = 0.6
+
+Measurements = namedtuple("Measurements", ["height_m", "weight_kg", "confidence", "spans"])
+
+NUM = r"\d+(?:[.,]\d+)?"
+# A unit must not run on into a longer word: "5 m" but not "5 min"
+END = r"(?![a-z])"
+# A labelled number is only unitless when no unit follows it
+NO_UNIT = r"""(?!\s*(?:cm|cms|centi|m\b|mtr|met|in\b|inch|ft|feet|foot|kg|kilo|lb|pound|st\b|stone|'|’|"|”))"""
+PATTERN = re.compile(rf"""
+    (?P<feet>\d(?:[.,]\d+)?)\s*(?:'|’|ft\.?|feet|foot){END}
+        (?:\s*(?P<inches>\d{{1,2}}(?:[.,]\d+)?)(?![\d.,]|\s*(?:kg|kilo|lb|pound|st{END}|stone))
+        (?:\s*(?:"|”|''|’’|in\.?{END}|inch(?:es)?{END}))?)?
+  | (?P<metres>\d)\s*m\s*(?P<centimetres>\d{{2}}){END}(?!\s*(?:cm|kg|lb))
+  | (?P<height>{NUM})\s*(?P<height_unit>cm|cms|centimet(?:er|re)s?|m|mtrs?|met(?:er|re)s?|in|inch(?:es)?|"|”){END}
+  | (?P<stone>{NUM})\s*(?:st|stones?){END}\s*(?:(?P<stone_pounds>\d{{1,2}}(?:[.,]\d+)?)\s*(?:lbs?|pounds?)?{END})?
+  | (?P<weight>{NUM})\s*(?P<weight_unit>kg|kgs|kilo(?:gram)?s?|lbs?|pounds?){END}
+  | (?P<height_label>height|tall)\W{{1,10}}?(?:is\s+|of\s+)?(?P<labelled_height>{NUM})(?![\d.,]){END}{NO_UNIT}
+  | (?P<weight_label>weight|weigh)\W{{1,10}}?(?:is\s+|of\s+)?(?P<labelled_weight>{NUM})(?![\d.,]){END}{NO_UNIT}
+""", re.IGNORECASE | re.VERBOSE)
+
+
+def _number(text):
+    return float(text.replace(",", "."))
+
+
+def _read(match):
+    # (kind, value in m or kg, confidence)
+    groups = match.groupdict()
+    if groups["feet"] is not None:
+        inches = _number(groups["inches"]) if groups["inches"] else 0.0
+        if inches >= 12:
+            return None
+        return "height", _number(groups["feet"]) * FOOT_M + inches * INCH_M, EXPLICIT
+    if groups["metres"] is not None:
+        return "height", int(groups["metres"]) + int(groups["centimetres"]) / 100, EXPLICIT
+    if groups["height"] is not None:
+        value = _number(groups["height"])
+        unit = groups["height_unit"].lower()
+        if unit.startswith("c"):
+            value /= 100
+        elif unit.startswith("i") or unit in ('"', "”"):
+            value *= INCH_M
+        return "height", value, EXPLICIT
+    if groups["stone"] is not None:
+        pounds = _number(groups["stone_pounds"]) if groups["stone_pounds"] else 0.0
+        return "weight", _number(groups["stone"]) * STONE_KG + pounds * POUND_KG, EXPLICIT
+    if groups["weight"] is not None:
+        value = _number(groups["weight"])
+        if groups["weight_unit"].lower().startswith(("l", "p")):
+            value *= POUND_KG
+        return "weight", value, EXPLICIT
+    if groups["labelled_height"] is not None:
+        value = _number(groups["labelled_height"])
+        # 175 is cm, 1.75 is m
+        return "height", value / 100 if value > MAX_HEIGHT_M else value, LABELLED
+    return "weight", _number(groups["labelled_weight"]), LABELLED
+
+
+def _single(values):
+    # Conflicting measurements are ambiguous; let the model sort them out.
+    # The same value in two units (170 cm / 5'7") is not a conflict.
+    if not values:
+        return None, None
+    value, confidence = values[0]
+    for other, other_confidence in values[1:]:
+        if abs(other - value) > value * 0.02:
+            return None, None
+        confidence = max(confidence, other_confidence)
+    return value, confidence
+
+
+def parse(user_input):
+    heights = []
+    weights = []
+    spans = []
+    for match in PATTERN.finditer(user_input):
+        reading = _read(match)
+        if reading is None:
+            continue
+        kind, value, confidence = reading
+        spans.append((match.start(), match.end(), kind))
+        if kind == "height" and MIN_HEIGHT_M <= value <= MAX_HEIGHT_M:
+            heights.append((value, confidence))
+        elif kind == "weight" and MIN_WEIGHT_KG <= value <= MAX_WEIGHT_KG:
+            weights.append((value, confidence))
+
+    height, height_confidence = _single(heights)
+    weight, weight_confidence = _single(weights)
+    found = [confidence for confidence in (height_confidence, weight_confidence) if confidence is not None]
+    return Measurements(height, weight, min(found, default=0.0), spans)
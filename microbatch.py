@@ -0,0 +1,110 @@
+# Micro-batching: prompts for the same key that arrive within a short
+# window go upstream as one completion, which pays for the system prompt
+# and the round trip once.
+#
+# The first caller in a window leads: it waits out the window (or until
+# the batch is full), sends the batch and hands each caller its reply.
+# A caller whose item was not answered, or failed validation, gets None
+# and makes its own call. Needs concurrent requests within one process,
+# so use gunicorn's --threads or the batch endpoint.
+
+import json
+import re
+import threading
+from concurrent.futures import Future
+
+FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+class _Batch:
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.items = []
+        self.full = threading.Event()
+
+
+class MicroBatcher:
+
+    def __init__(self, send, window=0.005, max_items=8, validate=None):
+        # send(key, inputs, deadline) returns one reply (or None) per input
+        self.send = send
+        self.window = window
+        self.max_items = max_items
+        self.validate = validate
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.batched_items = 0
+        self.rejected_items = 0
+
+    def submit(self, key, user_input, deadline):
+        future = Future()
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._pending[key] = _Batch(deadline)
+            batch.items.append((user_input, future))
+            if len(batch.items) >= self.max_items:
+                del self._pending[key]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._pending.get(key) is batch:
+                    del self._pending[key]
+            self._dispatch(key, batch)
+
+        return future.result(deadline.remaining())
+
+    def _dispatch(self, key, batch):
+        items = batch.items
+        # A batch of one is just a normal call
+        if len(items) == 1:
+            items[0][1].set_result(None)
+            return
+
+        try:
+            replies = self.send(key, [user_input for user_input, _ in items], batch.deadline)
+        except Exception:
+            replies = [None] * len(items)
+
+        accepted = 0
+        for (_, future), reply in zip(items, replies):
+            if reply is not None and self.validate is not None and not self.validate(reply):
+                reply = None
+            accepted += reply is not None
+            future.set_result(reply)
+
+        with self._lock:
+            self.batches += 1
+            self.batched_items += accepted
+            self.rejected_items += len(items) - accepted
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window_ms": self.window * 1000,
+                "max_items": self.max_items,
+                "batches": self.batches,
+                "batched_items": self.batched_items,
+                "rejected_items": self.rejected_items,
+                "mean_batch_size": round((self.batched_items + self.rejected_items) / self.batches, 2) if self.batches else 0.0
+            }
+
+
+def parse_replies(ai_msg, count):
+    # {"1": "...", "2": "..."} -> ["...", "..."], None where missing
+    try:
+        data = json.loads(FENCE_RE.sub("", ai_msg.strip()))
+    except ValueError:
+        return [None] * count
+    if not isinstance(data, dict):
+        return [None] * count
+    replies = []
+    for index in range(1, count + 1):
+        reply = data.get(str(index))
+        replies.append(reply.strip() if isinstance(reply, str) else None)
+    return replies
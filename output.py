@@ -0,0 +1,117 @@
+# Local checks against the OUTPUT FORMAT RULES in COPSTAR_PROMPT: a reply
+# is either exactly 4 "- " bullets or the single INVALID sentence.
+#
+# repair() fixes the usual near misses (intros, closers, other bullet
+# markers, blank lines, extra bullets) so only replies that cannot be
+# saved, such as too few bullets, need another upstream call.
+
+import re
+import threading
+from collections import namedtuple
+
+from prompts import INVALID_RESPONSE
+
+BULLET_COUNT = 4
+
+COMPLIANT = "compliant"
+REPAIRED = "repaired"
+FAILED = "failed"
+
+Checked = namedtuple("Checked", ["text", "status"])
+
+# "* x", "• x", "1. x", "2) x", "– x", "-x". "*" and "•" need a space
+# after them, or "**Tips**" would be a bullet.
+BULLET_RE = re.compile(r"^\s*(?:[-–—]\s*|[*•·]\s+|\d{1,2}[.)]\s*)(?=\S)")
+# "Here are your tips:", "Assistant Response:", "**Tips**"
+HEADING_RE = re.compile(
+    r"^\s*(?:\*\*.*\*\*|#+ .*|.*:\s*$|(?:here (?:are|is)|sure|certainly|of course|assistant response)\b.*)$",
+    re.IGNORECASE
+)
+# The end of a sentence, so whatever follows is not the same bullet
+SENTENCE_END_RE = re.compile(r"[.!?][\"'”’)]*\s*$")
+# A heading dressed up as a bullet: "- **Tips**", "1. Diet:"
+SUBHEADING_RE = re.compile(r"^(?:\*\*[^*]+\*\*|.*:)\s*$")
+
+_lock = threading.Lock()
+_counts = {COMPLIANT: 0, REPAIRED: 0, FAILED: 0, "retries": 0}
+
+
+def is_compliant(ai_msg):
+    if ai_msg == INVALID_RESPONSE:
+        return True
+    lines = ai_msg.split("\n")
+    return len(lines) == BULLET_COUNT and all(
+        line.startswith("- ") and line[2:].strip() for line in lines
+    )
+
+
+def normalize_line(line):
+    # One output line as a "- " bullet, or None when it is not a bullet.
+    # Works line by line, so streamed replies can use it too, and counting
+    # its results is how a stream knows the reply is complete.
+    if HEADING_RE.match(line):
+        return None
+    match = BULLET_RE.match(line)
+    if match is None:
+        return None
+    text = line[match.end():].strip()
+    if SUBHEADING_RE.match(text):
+        return None
+    text = text.replace("**", "").strip()
+    return f"- {text}" if text else None
+
+
+def continues(bullet, line):
+    # Whether line is the rest of bullet wrapped onto a new line, rather
+    # than a closing remark: only when the bullet stopped mid-sentence and
+    # line does not start a new one
+    text = line.strip()
+    return (
+        bool(text)
+        and SENTENCE_END_RE.search(bullet) is None
+        and not text[0].isupper()
+        and normalize_line(line) is None
+        and not HEADING_RE.match(line)
+    )
+
+
+def repair(ai_msg):
+    if is_compliant(ai_msg):
+        return Checked(ai_msg, COMPLIANT)
+
+    # The INVALID sentence wrapped in quotes or followed by chatter
+    if INVALID_RESPONSE in ai_msg and BULLET_RE.search(ai_msg) is None:
+        return Checked(INVALID_RESPONSE, REPAIRED)
+
+    bullets = []
+    # Whether the line before was part of a bullet
+    in_bullet = False
+    for line in ai_msg.split("\n"):
+        if not line.strip():
+            in_bullet = False
+            continue
+        bullet = normalize_line(line)
+        if bullet is not None:
+            bullets.append(bullet)
+            in_bullet = True
+        elif in_bullet and continues(bullets[-1], line):
+            # Keep it even past the fourth bullet: that one is the "see a
+            # doctor" advice
+            bullets[-1] += " " + line.strip()
+        else:
+            # An intro, heading or closing remark
+            in_bullet = False
+
+    if len(bullets) < BULLET_COUNT:
+        return Checked(ai_msg, FAILED)
+    return Checked("\n".join(bullets[:BULLET_COUNT]), REPAIRED)
+
+
+def record(status):
+    with _lock:
+        _counts[status] += 1
+
+
+def stats():
+    with _lock:
+        return dict(_counts)
@@ -0,0 +1,292 @@
+# Local stages that run around the upstream call, shared by app.py and
+# asgi.py.
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+import bmi
+import breaker
+import cache
+import canned
+import classifier
+import knowledge
+import microbatch
+import output
+import resp
+import retry
+import router
+import semantic
+import singleflight
+import upstream
+from prompts import INVALID_RESPONSE, PROMPT_VERSION
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+# "memory" keeps a cache per worker; "sqlite" shares one file at CACHE_PATH
+# between all workers on the machine; "redis" shares the server at
+# CACHE_URL between every instance
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("CACHE_PATH", "healthtip-cache.sqlite3")
+CACHE_URL = os.getenv("CACHE_URL", "redis://127.0.0.1:6379/0")
+CACHE_TIMEOUT_SECONDS = float(os.getenv("CACHE_TIMEOUT_SECONDS", "0.25"))
+
+# Set to a local directory to also coalesce across gunicorn workers
+SINGLEFLIGHT_DIR = os.getenv("SINGLEFLIGHT_DIR")
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Try each model of the mode's route in order, moving on only when the
+# reply breaks the output format
+MODEL_CASCADE = os.getenv("MODEL_CASCADE", "0") == "1"
+# Extra upstream calls for a reply that breaks the format beyond repair,
+# when the cascade is off
+FORMAT_RETRIES = int(os.getenv("FORMAT_RETRIES", "1"))
+
+# Collect prompts arriving within this many milliseconds into one upstream
+# completion; 0 turns micro-batching off
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", "0"))
+MICROBATCH_MAX_ITEMS = int(os.getenv("MICROBATCH_MAX_ITEMS", "8"))
+
+# Tries per upstream call for transient failures (429, 5xx, dropped
+# connections, malformed replies), counting the first
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY_MS = float(os.getenv("RETRY_BASE_DELAY_MS", "200"))
+RETRY_MAX_DELAY_MS = float(os.getenv("RETRY_MAX_DELAY_MS", "2000"))
+# Retries allowed per upstream call across the whole worker, e.g. 0.1 caps
+# retries at 10% of traffic
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+
+# Second cache tier that answers paraphrases of cached SYMPTOM prompts;
+# needs NumPy
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_THRESHOLD = float(os.getenv("SEMANTIC_THRESHOLD", "0.9"))
+# Share of semantic hits kept for review at /admin/semantic
+SEMANTIC_SAMPLE_RATE = float(os.getenv("SEMANTIC_SAMPLE_RATE", "0.05"))
+
+# Answer messages that are only about symptoms in the knowledge base from
+# its pre-approved tips instead of the model
+KNOWLEDGE_ANSWERS = os.getenv("KNOWLEDGE_ANSWERS", "1") == "1"
+
+
+def make_cache():
+    if CACHE_BACKEND == "redis":
+        client = resp.RedisClient(CACHE_URL, CACHE_TIMEOUT_SECONDS)
+        return cache.RedisCache(client, CACHE_TTL_SECONDS)
+    if CACHE_BACKEND == "sqlite":
+        return cache.SQLiteCache(CACHE_PATH, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_TIMEOUT_SECONDS)
+    return cache.LRUCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+
+
+response_cache = cache.Metered(make_cache())
+semantic_cache = None
+if SEMANTIC_CACHE and semantic.np is not None:
+    semantic_cache = semantic.SemanticCache(
+        SEMANTIC_THRESHOLD, CACHE_MAX_ENTRIES, sample_rate=SEMANTIC_SAMPLE_RATE, ttl=CACHE_TTL_SECONDS
+    )
+flights = singleflight.Group(SINGLEFLIGHT_DIR)
+circuit = breaker.CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+model_router = router.Router()
+retry_budget = retry.RetryBudget(RETRY_BUDGET_RATIO)
+
+
+def retry_policy(retriable_errors):
+    return retry.RetryPolicy(
+        retriable_errors,
+        RETRY_MAX_ATTEMPTS,
+        RETRY_BASE_DELAY_MS / 1000,
+        RETRY_MAX_DELAY_MS / 1000,
+        retry_budget
+    )
+
+
+retries = retry_policy((requests.ConnectionError, requests.Timeout, upstream.UpstreamError))
+
+def send_micro_batch(mode, user_inputs, deadline):
+    def call():
+        with upstream_call(mode) as model:
+            return upstream.complete(upstream.build_batch_payload(user_inputs, model), deadline)
+
+    ai_msg = retries.run(call, deadline)
+    replies = []
+    for reply in microbatch.parse_replies(ai_msg, len(user_inputs)):
+        if reply is not None:
+            checked = output.repair(upstream.clean_message(reply))
+            output.record(checked.status)
+            reply = checked.text if checked.status != output.FAILED else None
+        replies.append(reply)
+    return replies
+
+
+micro_batcher = None
+if MICROBATCH_WINDOW_MS > 0:
+    micro_batcher = microbatch.MicroBatcher(
+        send_micro_batch,
+        MICROBATCH_WINDOW_MS / 1000,
+        MICROBATCH_MAX_ITEMS,
+        validate=output.is_compliant
+    )
+
+_cascade_lock = threading.Lock()
+_cascade = {"answered_by_tier": {}, "escalations": 0}
+
+
+def local_answer(user_input):
+    # Classification plus a finished reply when no upstream call is needed
+    if not user_input or user_input.strip() == "":
+        return classifier.Classification(classifier.INVALID, True, None), INVALID_RESPONSE
+
+    # "hedache and feaver" should classify and match like "headache and fever"
+    text = knowledge.correct(user_input)
+    result = classifier.classify(text)
+    if KNOWLEDGE_ANSWERS and result.mode == classifier.SYMPTOM:
+        match = knowledge.lookup(text)
+        if match is not None and match.covered:
+            return result, match.reply
+    if not result.confident:
+        return result, None
+
+    if result.mode == classifier.BMI:
+        return result, bmi.format_tip(*bmi.compute(*result.measurements))
+    if result.mode == classifier.INVALID:
+        return result, INVALID_RESPONSE
+    return result, None
+
+
+def cache_key(user_input):
+    # The routing table stands in for the model: the mode, and so the
+    # route, follows from the input itself
+    return cache.make_key(user_input, router.ROUTES_VERSION, upstream.TEMPERATURE, PROMPT_VERSION)
+
+
+def cached_answer(user_input):
+    return response_cache.get(cache_key(user_input))
+
+
+def cached_answers(user_inputs):
+    # {user_input: reply} for the hits, in one round trip to the backend
+    user_inputs = list(dict.fromkeys(user_inputs))
+    replies = response_cache.get_many([cache_key(user_input) for user_input in user_inputs])
+    return {user_input: reply for user_input, reply in zip(user_inputs, replies) if reply is not None}
+
+
+def semantic_eligible(user_input, mode):
+    # Numbers change the answer (BMI, temperatures, ages), so only
+    # number-free SYMPTOM prompts are matched loosely
+    return (
+        semantic_cache is not None
+        and mode == classifier.SYMPTOM
+        and classifier.DIGIT_RE.search(user_input) is None
+    )
+
+
+def semantic_answer(user_input, mode):
+    if not semantic_eligible(user_input, mode):
+        return None
+    return semantic_cache.get(user_input)
+
+
+def remember(user_input, ai_msg, mode=None):
+    remember_many([(user_input, ai_msg, mode)])
+
+
+def remember_many(items):
+    # Stores (user_input, ai_msg, mode) replies in one round trip to the
+    # backend. Never keeps a reply that breaks the format, so the next ask
+    # retries.
+    items = [(user_input, ai_msg, mode) for user_input, ai_msg, mode in items if output.is_compliant(ai_msg)]
+    if not items:
+        return
+    response_cache.set_many([(cache_key(user_input), ai_msg) for user_input, ai_msg, _ in items])
+    for user_input, ai_msg, mode in items:
+        if semantic_eligible(user_input, mode):
+            semantic_cache.set(user_input, ai_msg)
+
+
+@contextmanager
+def upstream_call(mode, model=None):
+    # Guards one upstream call: refuses it while the circuit is open, picks
+    # the model unless given, and feeds the outcome back to the breaker and
+    # the router
+    circuit.check()
+    model = model or model_router.choose(mode)
+    start = time.perf_counter()
+    try:
+        yield model
+    except Exception:
+        model_router.record(model, time.perf_counter() - start, False)
+        circuit.record_failure()
+        raise
+    model_router.record(model, time.perf_counter() - start, True)
+    circuit.record_success()
+
+
+def upstream_attempts(mode):
+    # Models to try in order; None lets the router pick
+    if MODEL_CASCADE:
+        return model_router.candidates(mode)
+    return [None] * (1 + FORMAT_RETRIES)
+
+
+def record_cascade(tier, escalated):
+    with _cascade_lock:
+        if escalated:
+            _cascade["escalations"] += 1
+        else:
+            _cascade["answered_by_tier"][tier] = _cascade["answered_by_tier"].get(tier, 0) + 1
+
+
+def cascade_stats():
+    with _cascade_lock:
+        return {
+            "enabled": MODEL_CASCADE,
+            "escalations": _cascade["escalations"],
+            "answered_by_tier": dict(_cascade["answered_by_tier"])
+        }
+
+
+def fetch_once(user_input, mode, fetch, deadline=None, store=True):
+    # Concurrent identical prompts share one upstream call. Callers that
+    # store replies together pass store=False and call remember_many().
+    def run():
+        ai_msg = fetch(user_input, mode, deadline)
+        if store:
+            remember(user_input, ai_msg, mode)
+        return ai_msg
+
+    timeout = deadline.remaining() if deadline is not None else None
+    return flights.do(cache_key(user_input), run, timeout)
+
+
+def fallback_answer(user_input, result):
+    # Local reply for when upstream misses the deadline, fails, or the
+    # circuit is open. BMI MODE never gets here: it is always local.
+    stale = response_cache.get_stale(cache_key(user_input))
+    if stale is not None:
+        return stale
+    # Only a sure INVALID gets the INVALID sentence: an unsure one may be a
+    # health question the classifier has no word for
+    if result.mode == classifier.INVALID and result.confident:
+        return INVALID_RESPONSE
+    # Tips for the symptoms we recognise beat generic ones, even when the
+    # message says more than the knowledge base covers, unless it sounds
+    # serious
+    match = knowledge.lookup(knowledge.correct(user_input))
+    if match is not None and not match.red_flag:
+        return match.reply
+    return canned.GENERAL_TIPS
+
+
+def readiness():
+    # Still ready while the circuit is open: requests are served from the
+    # degraded local pipeline, and failing readiness on every instance at
+    # once during an upstream outage would take the whole service down
+    stats = circuit.stats()
+    return {
+        "status": "degraded" if stats["state"] == breaker.OPEN else "ready",
+        "breaker": stats
+    }
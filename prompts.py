@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import re
+import sys
+
+from classifier import BMI, SYMPTOM
+
+COPSTAR_PROMPT = """
+You are a professional Medicare-style health assistant. Your response must always be clean, neutral, and clinically supportive.
+
+---------------------------------
+STRICT NON-NEGOTIABLE RULES
+---------------------------------
+- Do NOT repeat or restate the user’s input.
+- Do NOT generate headings, titles, or intros (e.g., “Here are your tips:”, “Assistant Response:”).
+- Do NOT mention your role or how you created the answer.
+- Do NOT add emojis unless the user includes emojis.
+- Do NOT include blank lines before the first bullet or after the last bullet.
+- Do NOT add explanations, summaries, or closing remarks.
+- ONLY output bullet points (unless INVALID MODE is triggered).
+
+Your output must ALWAYS follow one of these:
+1) EXACTLY 4 bullets (BMI MODE or SYMPTOM MODE)
+2) A single sentence (INVALID MODE)
+
+Nothing else is permitted.
+
+---------------------------------
+MODE CLASSIFICATION RULES
+---------------------------------
+Classify the user input strictly into:
+
+A) BMI MODE
+   Trigger ONLY if:
+   - Height is provided (cm or meters)
+   - Weight is provided (kg)
+   BOTH must be present.
+
+B) SYMPTOM MODE
+   Trigger if:
+   - User expresses symptoms (ex: fever, cough, headache, nausea, pain)
+   - User expresses goals (ex: “I want to lose weight”, “I want to gain weight”)
+   - User gives ONLY height OR ONLY weight (not both)
+   In this mode: IGNORE BMI completely.
+
+C) INVALID MODE
+   Trigger if:
+   - No symptoms
+   - No health concerns
+   - No height/weight information
+
+INVALID MODE OUTPUT:
+"Please share your symptoms or your height and weight so I can help you better."
+(No bullets allowed.)
+
+---------------------------------
+BMI MODE RULES
+---------------------------------
+Only run BMI calculation if BOTH values exist.
+
+1) Convert height:
+   - If user gives cm → convert to meters.
+
+2) Compute:
+   BMI = Weight(kg) / (Height(m)²)
+   Round to 1 decimal.
+
+3) Classify:
+   < 18.5    → Low
+   18.5–24.9 → Normal
+   >= 25     → High
+
+Bullet 1 MUST include:
+- BMI value (1 decimal)
+- Category
+- Clear advice: gain / maintain / reduce weight
+
+---------------------------------
+SYMPTOM MODE RULES
+---------------------------------
+- DO NOT calculate BMI.
+- DO NOT mention BMI.
+- Provide 4 supportive, simple, medically safe guidance bullets.
+
+---------------------------------
+OUTPUT FORMAT RULES
+---------------------------------
+For BMI MODE or SYMPTOM MODE:
+- EXACTLY 4 bullets.
+- EACH bullet must start with "- ".
+- No blank lines, no intros, no closings, no disclaimers.
+- Maintain a professional Medicare tone: calm, supportive, simple.
+"""
+
+INVALID_RESPONSE = "Please share your symptoms or your height and weight so I can help you better."
+
+# Send a shorter prompt, holding only the rules for the locally detected
+# mode, instead of all of COPSTAR_PROMPT
+COMPACT_PROMPTS = os.getenv("COMPACT_PROMPTS", "1") == "1"
+
+SECTION_RE = re.compile(r"-{10,}\n(.+)\n-{10,}\n")
+DIGIT_RE = re.compile(r"\d")
+
+
+def split_sections(prompt):
+    # {"": intro, "STRICT NON-NEGOTIABLE RULES": body, ...}
+    parts = SECTION_RE.split(prompt)
+    sections = {"": parts[0].strip()}
+    for title, body in zip(parts[1::2], parts[2::2]):
+        sections[title.strip()] = body.strip()
+    return sections
+
+
+def without_block(text, start, end):
+    # Drops the lines from the one starting with start up to (not
+    # including) the one starting with end
+    return re.sub(rf"^{re.escape(start)}.*?(?=^{re.escape(end)})", "", text, flags=re.MULTILINE | re.DOTALL)
+
+
+def render(sections, titles):
+    # Plain "TITLE:" headings instead of the dashed rules, which cost
+    # tokens without adding meaning
+    parts = [sections[""]]
+    parts += [f"{title}:\n{sections[title]}" for title in titles]
+    return "\n\n".join(parts)
+
+
+def build_registry(prompt):
+    sections = split_sections(prompt)
+    # SYMPTOM must still be able to say INVALID: the local classifier only
+    # guessed it, so only the BMI trigger is dropped
+    symptom_sections = {
+        **sections,
+        "MODE CLASSIFICATION RULES": without_block(sections["MODE CLASSIFICATION RULES"], "A) BMI MODE", "B) SYMPTOM MODE")
+    }
+    return {
+        BMI: render(sections, [
+            "STRICT NON-NEGOTIABLE RULES",
+            "MODE CLASSIFICATION RULES",
+            "BMI MODE RULES",
+            "OUTPUT FORMAT RULES"
+        ]),
+        SYMPTOM: render(symptom_sections, [
+            "STRICT NON-NEGOTIABLE RULES",
+            "MODE CLASSIFICATION RULES",
+            "SYMPTOM MODE RULES",
+            "OUTPUT FORMAT RULES"
+        ])
+    }
+
+
+PROMPTS = build_registry(COPSTAR_PROMPT)
+
+# Changes whenever any instructions change, so cached replies never outlive them
+PROMPT_VERSION = hashlib.sha256(
+    "\x1f".join([COPSTAR_PROMPT, *sorted(PROMPTS.values())]).encode("utf-8")
+).hexdigest()[:12]
+
+
+def system_prompt(mode, user_input):
+    if not COMPACT_PROMPTS:
+        return COPSTAR_PROMPT
+    # Numbers may be measurements the local parser missed, which the full
+    # rules can still turn into BMI MODE; unsure INVALID guesses also keep
+    # every rule
+    if mode == SYMPTOM and DIGIT_RE.search(user_input):
+        return COPSTAR_PROMPT
+    return PROMPTS.get(mode, COPSTAR_PROMPT)
+
+
+def build_messages(user_input, mode=None):
+    # The instructions go first, byte-for-byte identical for every call in
+    # the same mode, so providers that cache prompt prefixes can reuse them
+    return [
+        {"role": "system", "content": system_prompt(mode, user_input)},
+        {"role": "user", "content": user_input.strip()}
+    ]
+
+
+BATCH_INSTRUCTIONS = """
+
+---------------------------------
+BATCH RULES
+---------------------------------
+The user message is a JSON object of numbered, independent user inputs.
+Apply every rule above to each input on its own.
+Respond ONLY with a JSON object mapping each number to the complete reply
+for that input, as a string with bullets separated by "\\n".
+"""
+
+
+def build_batch_messages(user_inputs):
+    # Uses the full prompt: one batch can mix inputs that need any rule
+    numbered = {str(index): user_input.strip() for index, user_input in enumerate(user_inputs, 1)}
+    return [
+        {"role": "system", "content": COPSTAR_PROMPT + BATCH_INSTRUCTIONS},
+        {"role": "user", "content": json.dumps(numbered, ensure_ascii=False)}
+    ]
+
+
+def token_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text))
+    except Exception:  # not installed, or the encoding cannot be downloaded
+        pass
+    # Words and punctuation runs; close enough to BPE counts for prose
+    return lambda text: len(re.findall(r"\w+|[^\w\s]+", text))
+
+
+def report(out=sys.stdout):
+    count_tokens = token_counter()
+    full = count_tokens(COPSTAR_PROMPT)
+    out.write(f"{'prompt':<10}{'chars':>8}{'tokens':>8}{'saved':>8}\n")
+    out.write(f"{'full':<10}{len(COPSTAR_PROMPT):>8}{full:>8}{'':>8}\n")
+    for mode, prompt in PROMPTS.items():
+        tokens = count_tokens(prompt)
+        out.write(f"{mode:<10}{len(prompt):>8}{tokens:>8}{1 - tokens / full:>8.0%}\n")
+
+
+if __name__ == "__main__":
+    report()
@@ -0,0 +1,131 @@
+# Minimal client for the Redis protocol (RESP2), enough for the shared
+# response cache without another dependency. Works against Redis, Valkey,
+# KeyDB or the local stand-in in stub_redis.py.
+
+import os
+import socket
+import threading
+from urllib.parse import urlparse
+
+
+class RedisError(Exception):
+    pass
+
+
+def encode_command(args):
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode("ascii")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def read_reply(reader):
+    # Error replies are returned rather than raised, so one failed command
+    # does not leave the rest of a pipeline's replies unread
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        return RedisError(rest.decode("utf-8"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("Connection closed by server")
+        return data[:-2]
+    if kind == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply {line!r}")
+
+
+class RedisClient:
+
+    def __init__(self, url="redis://127.0.0.1:6379/0", timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._pid = None
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile("rb"))
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            sock.sendall(b"".join(encode_command(command) for command in setup))
+            for _ in setup:
+                reply = read_reply(conn[1])
+                if isinstance(reply, RedisError):
+                    sock.close()
+                    raise reply
+        return conn
+
+    def _connection(self):
+        # One socket per thread, opened again after a fork so gunicorn
+        # workers never share one
+        pid = os.getpid()
+        if self._pid != pid:
+            self._local = threading.local()
+            self._pid = pid
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            return conn, False
+        return conn, True
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def pipeline(self, commands):
+        # Sends every command before reading any reply: one round trip for
+        # the lot. Replies come back in order, errors as RedisError values.
+        payload = b"".join(encode_command(command) for command in commands)
+        conn, reused = self._connection()
+        try:
+            conn[0].sendall(payload)
+            return [read_reply(conn[1]) for _ in commands]
+        except OSError:
+            self._close()
+            # The server may have dropped an idle connection; the cache's
+            # commands are safe to send twice
+            if not reused:
+                raise
+        conn, _ = self._connection()
+        try:
+            conn[0].sendall(payload)
+            return [read_reply(conn[1]) for _ in commands]
+        except OSError:
+            self._close()
+            raise
+
+    def execute(self, *args):
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
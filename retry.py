@@ -0,0 +1,126 @@
+# Retries for transient upstream failures.
+#
+# Only errors that can succeed on a second try are retried: connection
+# problems, 408/429/5xx and malformed or empty completions. Waits use
+# full-jitter exponential backoff, or the server's Retry-After when it asks
+# for longer, and never run past the request deadline.
+#
+# A retry budget shared by the whole process keeps retries to a fixed
+# share of traffic: every request earns `ratio` of a retry and every retry
+# spends one. During an outage the budget runs dry and requests fail fast
+# instead of multiplying the load on the upstream.
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+RETRIABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    # Retry-After is either delta-seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryBudget:
+
+    def __init__(self, ratio=0.1, initial=10.0, maximum=100.0):
+        self.ratio = ratio
+        self.maximum = maximum
+        self._balance = initial
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self._balance + self.ratio, self.maximum)
+
+    def withdraw(self):
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+    @property
+    def balance(self):
+        return self._balance
+
+
+class RetryPolicy:
+
+    def __init__(self, retriable_errors, max_attempts=3, base_delay=0.2, max_delay=2.0, budget=None):
+        # retriable_errors: exception types that count as transient unless
+        # they carry an HTTP status outside RETRIABLE_STATUSES
+        self.retriable_errors = retriable_errors
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "retries": 0, "not_retriable": 0, "out_of_attempts": 0, "budget_exhausted": 0, "no_time": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def is_retriable(self, exc):
+        status = getattr(exc, "status", None)
+        if status is not None:
+            return status in RETRIABLE_STATUSES
+        return isinstance(exc, self.retriable_errors)
+
+    def next_delay(self, attempt, exc, remaining):
+        # Seconds to wait before attempt + 1, or None to give up
+        if not self.is_retriable(exc):
+            self._count("not_retriable")
+            return None
+        if attempt >= self.max_attempts:
+            self._count("out_of_attempts")
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if delay >= remaining:
+            self._count("no_time")
+            return None
+        if not self.budget.withdraw():
+            self._count("budget_exhausted")
+            return None
+        self._count("retries")
+        return delay
+
+    def start(self):
+        self._count("calls")
+        self.budget.deposit()
+
+    def run(self, fn, deadline):
+        self.start()
+        attempt = 1
+        while True:
+            try:
+                return fn()
+            except Exception as exc:
+                delay = self.next_delay(attempt, exc, deadline.remaining())
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self._counts, "budget_balance": round(self.budget.balance, 2)}
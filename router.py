@@ -0,0 +1,102 @@
+# Picks the upstream model for a request from the routing table entry for
+# its mode, preferring whichever candidate has recently been fastest and
+# most reliable.
+#
+# MODEL_ROUTES overrides the table as JSON, e.g.
+#   {"SYMPTOM": ["mistralai/mistral-small-3.2-24b-instruct"], "BMI": [...]}
+
+import hashlib
+import json
+import os
+import random
+import threading
+
+LARGE_MODEL = "mistralai/mistral-large-2411"
+SMALL_MODEL = "mistralai/mistral-small-3.2-24b-instruct"
+
+# BMI only reaches the model when the local parser was unsure, which is
+# exactly when the large model earns its cost
+DEFAULT_ROUTES = {
+    "BMI": [LARGE_MODEL],
+    "SYMPTOM": [SMALL_MODEL, LARGE_MODEL],
+    "INVALID": [SMALL_MODEL, LARGE_MODEL]
+}
+
+ROUTES = {**DEFAULT_ROUTES, **json.loads(os.getenv("MODEL_ROUTES") or "{}")}
+ROUTES_VERSION = hashlib.sha256(json.dumps(ROUTES, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.2"))
+# Each step down a route's list costs this much extra, so earlier (cheaper)
+# models win unless they are clearly slower or failing
+ORDER_PENALTY = float(os.getenv("ROUTER_ORDER_PENALTY", "0.25"))
+ERROR_PENALTY = float(os.getenv("ROUTER_ERROR_PENALTY", "4.0"))
+# Latency assumed for a model that has been called but never answered, so
+# its error penalty still counts against it
+DEFAULT_LATENCY_MS = float(os.getenv("ROUTER_DEFAULT_LATENCY_MS", "3000"))
+# Share of calls sent to a random candidate so stale averages get refreshed
+EXPLORE_RATE = float(os.getenv("ROUTER_EXPLORE_RATE", "0.05"))
+
+
+class ModelStats:
+
+    def __init__(self):
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, latency, ok):
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+        self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        # Failed calls say little about how fast the model answers
+        if ok:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += EWMA_ALPHA * (latency - self.latency)
+
+
+class Router:
+
+    def __init__(self, routes=ROUTES):
+        self.routes = routes
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, mode):
+        return self.routes.get(mode) or [LARGE_MODEL]
+
+    def _score(self, model, position):
+        stats = self._stats.get(model)
+        # Uncalled models go first so every candidate gets a baseline
+        if stats is None or stats.calls == 0:
+            return -1.0 / (position + 1)
+        latency = stats.latency if stats.latency is not None else DEFAULT_LATENCY_MS / 1000
+        return latency * (1 + ORDER_PENALTY * position) * (1 + ERROR_PENALTY * stats.error_rate)
+
+    def choose(self, mode):
+        candidates = self.candidates(mode)
+        if len(candidates) > 1 and random.random() < EXPLORE_RATE:
+            return random.choice(candidates)
+        with self._lock:
+            return min(enumerate(candidates), key=lambda item: self._score(item[1], item[0]))[1]
+
+    def record(self, model, latency, ok):
+        with self._lock:
+            self._stats.setdefault(model, ModelStats()).record(latency, ok)
+
+    def stats(self):
+        with self._lock:
+            models = {
+                model: {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "ewma_latency_ms": round(stats.latency * 1000, 1) if stats.latency is not None else None,
+                    "ewma_error_rate": round(stats.error_rate, 3)
+                }
+                for model, stats in self._stats.items()
+            }
+        return {"routes": self.routes, "models": models}
@@ -0,0 +1,158 @@
+# Second cache tier for paraphrases: "i got a fever" and "I have fever"
+# miss the exact-match cache but should get the same reply.
+#
+# Prompts are embedded locally with feature hashing (words plus character
+# n-grams, so "cough" and "coughing" overlap) into unit vectors kept as
+# rows of a NumPy matrix. A lookup is one matrix-vector product; the best
+# row answers when its cosine similarity clears the threshold. Rows expire
+# after the same TTL as the exact-match cache.
+#
+# A sample of hits is kept with both prompts so false matches can be
+# reviewed at /admin/semantic before the threshold is loosened.
+
+import random
+import re
+import threading
+import time
+import zlib
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:  # optional; the semantic tier stays off without it
+    np = None
+
+from cache import normalize
+
+# Words that do not change the question. Negations stay: "no fever" and
+# "fever" are different questions.
+STOPWORDS = frozenset("""
+a an the i im m s ve ll re d me my mine we our you your it its is am are was were
+be been being have has had having got get getting do does did doing so very really just also and or
+but of to in on at for with about from by as this that these those some any what
+which who how can could would should will shall may might must please tell give
+suggest advice tips tip help feel feeling since today now like
+""".split())
+
+TOKEN_RE = re.compile(r"\w+")
+NGRAM = 4
+NGRAM_WEIGHT = 0.5
+
+
+def features(text):
+    words = [word for word in TOKEN_RE.findall(normalize(text)) if word not in STOPWORDS]
+    for word in words:
+        yield word, 1.0
+        padded = f" {word} "
+        for index in range(len(padded) - NGRAM + 1):
+            yield "#" + padded[index:index + NGRAM], NGRAM_WEIGHT
+
+
+def embed(text, dims):
+    # Signed feature hashing; crc32 is stable across processes, unlike hash()
+    vector = np.zeros(dims, dtype=np.float32)
+    for feature, weight in features(text):
+        digest = zlib.crc32(feature.encode("utf-8"))
+        vector[digest % dims] += weight if digest & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+class SemanticCache:
+
+    def __init__(self, threshold=0.9, max_entries=2048, dims=1024, sample_rate=0.05, samples=50, ttl=3600):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.dims = dims
+        self.sample_rate = sample_rate
+        self._vectors = np.zeros((max_entries, dims), dtype=np.float32)
+        self._prompts = [None] * max_entries
+        self._replies = [None] * max_entries
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._size = 0
+        # Next row to overwrite once full, oldest first
+        self._next = 0
+        self._lock = threading.Lock()
+        self.samples = deque(maxlen=samples)
+        self.lookups = 0
+        self.hits = 0
+        self.similarity_total = 0.0
+
+    def _best(self, vector, now):
+        scores = self._vectors[:self._size] @ vector
+        # Expired rows can never clear the threshold
+        scores[self._expires[:self._size] <= now] = -np.inf
+        row = int(np.argmax(scores))
+        return row, float(scores[row])
+
+    def get(self, user_input):
+        vector = embed(user_input, self.dims)
+        with self._lock:
+            self.lookups += 1
+            if vector is None or self._size == 0:
+                return None
+            row, similarity = self._best(vector, time.time())
+            if similarity < self.threshold:
+                return None
+            self.hits += 1
+            self.similarity_total += similarity
+            if random.random() < self.sample_rate:
+                self.samples.append({
+                    "prompt": user_input,
+                    "matched": self._prompts[row],
+                    "similarity": round(similarity, 3)
+                })
+            return self._replies[row]
+
+    def set(self, user_input, reply):
+        vector = embed(user_input, self.dims)
+        if vector is None:
+            return
+        now = time.time()
+        with self._lock:
+            # A paraphrase of a stored prompt refreshes its row instead of
+            # taking another one
+            if self._size:
+                row, similarity = self._best(vector, now)
+                if similarity >= 0.999:
+                    self._replies[row] = reply
+                    self._expires[row] = now + self.ttl
+                    return
+            row = self._next
+            self._vectors[row] = vector
+            self._prompts[row] = user_input
+            self._replies[row] = reply
+            self._expires[row] = now + self.ttl
+            self._next = (row + 1) % self.max_entries
+            self._size = max(self._size, row + 1)
+
+    def clear(self):
+        with self._lock:
+            flushed = self._size
+            self._vectors[:] = 0
+            self._prompts = [None] * self.max_entries
+            self._replies = [None] * self.max_entries
+            self._expires[:] = 0
+            self._size = 0
+            self._next = 0
+            self.samples.clear()
+        return flushed
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                "entries": self._size,
+                "live_entries": int(np.count_nonzero(self._expires[:self._size] > now)),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "dims": self.dims,
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_ratio": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "mean_hit_similarity": round(self.similarity_total / self.hits, 3) if self.hits else 0.0,
+                "sample_rate": self.sample_rate,
+                "samples": list(self.samples)
+            }
@@ -0,0 +1,148 @@
+# Request coalescing: while a call for a key is in flight, other callers
+# for the same key wait for it and share its result instead of making
+# their own.
+#
+# Within a process this uses threads. With a shared directory, the leader
+# of each process also takes an flock on a per-key file and publishes its
+# result there, so workers on the same machine coalesce too.
+
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process coalescing only
+    fcntl = None
+
+# Shared-directory files are swept after this many leader calls
+SWEEP_EVERY = 256
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Group:
+
+    def __init__(self, shared_dir=None, share_seconds=5.0, wait_seconds=30.0):
+        self.shared_dir = shared_dir if fcntl is not None else None
+        self.share_seconds = share_seconds
+        self.wait_seconds = wait_seconds
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+        self.shared_across_workers = 0
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+
+    def do(self, key, fn, timeout=None):
+        # Followers give up with TimeoutError after timeout seconds; the
+        # leader's own call is bounded by whatever fn does
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(key)
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._run(key, fn)
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def _run(self, key, fn):
+        if not self.shared_dir:
+            return fn()
+        if self.leaders % SWEEP_EVERY == 0:
+            self._sweep()
+
+        base = os.path.join(self.shared_dir, key)
+        with open(base + ".lock", "a") as lock_file:
+            locked = self._flock(lock_file)
+            try:
+                value = self._read_shared(base + ".json")
+                if value is not None:
+                    with self._lock:
+                        self.shared_across_workers += 1
+                    return value
+                value = fn()
+                self._write_shared(base + ".json", value)
+                return value
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _flock(self, lock_file):
+        # A stuck leader in another worker must not hold everyone forever
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.01)
+
+    def _read_shared(self, path):
+        try:
+            if time.time() - os.path.getmtime(path) > self.share_seconds:
+                return None
+            with open(path) as f:
+                return json.load(f)["value"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_shared(self, path, value):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"value": value}, f)
+            os.replace(tmp, path)
+        except (OSError, TypeError):
+            pass
+
+    def _sweep(self):
+        # Removing a lock file someone still holds only costs that key one
+        # missed coalesce, never a wrong answer
+        cutoff = time.time() - max(self.share_seconds, self.wait_seconds) * 2
+        try:
+            entries = list(os.scandir(self.shared_dir))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "shared_across_workers": self.shared_across_workers,
+            "cross_worker": bool(self.shared_dir)
+        }
@@ -0,0 +1,86 @@
+# Typo lookup over a fixed vocabulary: every term within edit distance k
+# of a word.
+#
+# A BK-tree was the first choice, but its distance computations in Python
+# came to milliseconds per lookup over a few thousand terms. This uses
+# symmetric deletion instead (as in SymSpell): if two words are within k
+# edits, deleting at most k characters from each makes them equal. Every
+# term is indexed under its deletion variants up front, so a lookup only
+# generates the variants of the query, collects the terms filed under them
+# and confirms each with the real edit distance.
+
+from itertools import combinations
+
+
+def edit_distance(a, b, limit):
+    # Levenshtein distance, or limit + 1 once it must exceed limit. Uses
+    # Myers' bit-parallel method: one column of the DP table per character
+    # of b, held as bit vectors of the +1/-1 steps down that column.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if not a or not b:
+        return min(len(a) + len(b), limit + 1)
+    peq = {}
+    for index, char in enumerate(a):
+        peq[char] = peq.get(char, 0) | (1 << index)
+    mask = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    pv, mv, score = mask, 0, len(a)
+    remaining = len(b)
+    for char in b:
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        remaining -= 1
+        # Each character left can lower the score by at most one
+        if score - remaining > limit:
+            return limit + 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+    return min(score, limit + 1)
+
+
+def deletions(word, count):
+    # word with every choice of up to count characters removed
+    variants = {word}
+    for removed in range(1, min(count, len(word)) + 1):
+        for positions in combinations(range(len(word)), removed):
+            variants.add("".join(char for index, char in enumerate(word) if index not in positions))
+    return variants
+
+
+class TypoIndex:
+
+    def __init__(self, words=(), max_distance=2):
+        self.max_distance = max_distance
+        self._terms = {}
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        self.size += 1
+        for variant in deletions(word, self.max_distance):
+            self._terms.setdefault(variant, set()).add(word)
+
+    def search(self, word, limit):
+        # [(distance, term)] for every term within limit, closest first
+        limit = min(limit, self.max_distance)
+        candidates = set()
+        for variant in deletions(word, limit):
+            candidates.update(self._terms.get(variant, ()))
+        found = []
+        for term in candidates:
+            distance = edit_distance(word, term, limit)
+            if distance <= limit:
+                found.append((distance, term))
+        found.sort()
+        return found
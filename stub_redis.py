@@ -0,0 +1,124 @@
+# Local stand-in for a Redis server, for tests and benchmarks of the
+# shared cache. Understands the handful of commands RedisCache sends.
+#
+#   python stub_redis.py --port 6380
+#   CACHE_BACKEND=redis CACHE_URL=redis://127.0.0.1:6380/0 gunicorn app:app
+
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+
+from resp import RedisError, read_reply
+
+
+def encode_reply(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RedisError):
+        return b"-%s\r\n" % str(value).encode("utf-8")
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode("utf-8")
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+
+
+class Store:
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def command(self, args):
+        name = args[0].decode("utf-8").upper()
+        args = args[1:]
+        with self._lock:
+            if name == "PING":
+                return "PONG"
+            if name in ("AUTH", "SELECT"):
+                return "OK"
+            if name == "GET":
+                entry = self._live(args[0])
+                return entry[0] if entry is not None else None
+            if name == "SET":
+                expires_at = None
+                options = [arg.decode("utf-8").upper() for arg in args[2:]]
+                if "EX" in options:
+                    expires_at = time.monotonic() + float(options[options.index("EX") + 1])
+                elif "PX" in options:
+                    expires_at = time.monotonic() + float(options[options.index("PX") + 1]) / 1000
+                self._data[args[0]] = (args[1], expires_at)
+                return "OK"
+            if name == "DEL":
+                return sum(self._data.pop(key, None) is not None for key in args)
+            if name == "DBSIZE":
+                return sum(self._live(key) is not None for key in list(self._data))
+            if name == "FLUSHDB":
+                self._data.clear()
+                return "OK"
+            if name == "SCAN":
+                # The cursor is an offset into the sorted key list
+                cursor = int(args[0])
+                options = [arg.decode("utf-8") for arg in args[1:]]
+                pattern = options[options.index("MATCH") + 1] if "MATCH" in options else "*"
+                count = int(options[options.index("COUNT") + 1]) if "COUNT" in options else 10
+                keys = sorted(self._data)
+                page = keys[cursor:cursor + count]
+                following = cursor + count if cursor + count < len(keys) else 0
+                matched = [key for key in page if fnmatch.fnmatchcase(key.decode("utf-8", "replace"), pattern)]
+                return [str(following).encode("ascii"), matched]
+        return RedisError(f"ERR unknown command '{name}'")
+
+
+class StubHandler(socketserver.StreamRequestHandler):
+    # Pipelined replies go out as separate small writes
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        while True:
+            try:
+                args = read_reply(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            if not isinstance(args, list) or not args:
+                self.wfile.write(encode_reply(RedisError("ERR expected a command array")))
+                continue
+            self.wfile.write(encode_reply(self.server.store.command(args)))
+
+
+class StubServer(socketserver.ThreadingTCPServer):
+    request_queue_size = 1024
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, StubHandler)
+        self.store = Store()
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled connections are expected
+        pass
+
+
+def make_server(host="127.0.0.1", port=6380):
+    return StubServer((host, port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    make_server(args.host, args.port).serve_forever()
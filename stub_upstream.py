@@ -0,0 +1,121 @@
+# Local stand-in for the OpenRouter completions endpoint, for tests and
+# benchmarks. Point the app at it with
+#
+#   python stub_upstream.py --port 8081 --delay 1.5 --token-delay 0.02
+#   OPENROUTER_URL=http://127.0.0.1:8081/api/v1/chat/completions gunicorn app:app
+#
+# Requests with "stream": true get the reply as server-sent events, one
+# word per chunk.
+
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_TIP = (
+    "- Rest as much as you can and avoid strenuous activity.\n"
+    "- Drink water and clear fluids regularly through the day.\n"
+    "- Eat light, simple meals while you recover.\n"
+    "- Contact your doctor if symptoms worsen or last more than a few days."
+)
+
+
+def usage_for(payload, seen_prefixes):
+    # Rough token counts; a system prompt seen before counts as cached,
+    # like provider-side prompt caching
+    messages = payload.get("messages") or []
+    system = "".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+    cached_tokens = len(system) // 4 if system in seen_prefixes else 0
+    seen_prefixes.add(system)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(STUB_TIP) // 4,
+        "total_tokens": prompt_tokens + len(STUB_TIP) // 4,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens}
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    token_delay = 0.0
+    seen_prefixes = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.delay)
+
+        usage = usage_for(payload, self.seen_prefixes)
+        if payload.get("stream"):
+            self.send_stream(usage)
+            return
+
+        content = STUB_TIP
+        messages = payload.get("messages") or []
+        if messages and "BATCH RULES" in messages[0].get("content", ""):
+            numbered = json.loads(messages[-1]["content"])
+            content = json.dumps({number: STUB_TIP for number in numbered})
+
+        body = json.dumps({
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": usage
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def send_stream(self, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in re.findall(r"\S+\s*", STUB_TIP):
+                event = json.dumps({"choices": [{"delta": {"content": token}}]})
+                self.send_chunk(f"data: {event}\n\n".encode("utf-8"))
+                time.sleep(self.token_delay)
+            event = json.dumps({"choices": [], "usage": usage})
+            self.send_chunk(f"data: {event}\n\n".encode("utf-8"))
+            self.send_chunk(b"data: [DONE]\n\n")
+            self.send_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the generation
+            self.close_connection = True
+
+
+class StubServer(ThreadingHTTPServer):
+    # Default listen backlog of 5 drops connects under benchmark load
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive or cancelled streams are expected
+        pass
+
+
+def make_server(host="127.0.0.1", port=8081, delay=0.0, token_delay=0.0):
+    handler = type("Handler", (StubHandler,), {"delay": delay, "token_delay": token_delay})
+    return StubServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before each reply")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    args = parser.parse_args()
+
+    make_server(args.host, args.port, args.delay, args.token_delay).serve_forever()
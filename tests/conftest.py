@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+import breaker
+import cache
+import pipeline
+import router
+import stub_redis
+import stub_upstream
+import upstream
+
+
+def serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stub_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/api/v1/chat/completions"
+
+
+@pytest.fixture(scope="session")
+def upstream_server():
+    server = serve(stub_upstream.make_server(port=0))
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def slow_upstream_server():
+    server = serve(stub_upstream.make_server(port=0, delay=1.0))
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def redis_server():
+    server = serve(stub_redis.make_server(port=0))
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fresh_pipeline(monkeypatch, upstream_server):
+    # Every test gets an empty cache, a closed circuit and a fresh router,
+    # and talks to the stub instead of OpenRouter
+    monkeypatch.setattr(upstream, "OPENROUTER_URL", stub_url(upstream_server))
+    monkeypatch.setattr(pipeline, "response_cache", cache.Metered(cache.LRUCache(64, 60)))
+    monkeypatch.setattr(pipeline, "circuit", breaker.CircuitBreaker(2, 0.2))
+    monkeypatch.setattr(pipeline, "model_router", router.Router())
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+import asgi
+import stub_upstream
+from conftest import stub_url
+from deadline import Deadline, DeadlineExceeded
+
+
+def call(method, path, body=b""):
+    # (status, headers, json body) for one request through asgi.app
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        scope = {"type": "http", "method": method, "path": path}
+        try:
+            await asgi.app(scope, receive, send)
+        finally:
+            # The client belongs to this event loop
+            await asgi.close_client()
+
+    asyncio.run(run())
+    start, response = messages
+    return start["status"], dict(start["headers"]), json.loads(response["body"])
+
+
+def post(user_prompt):
+    return call("POST", "/healthtip", json.dumps({"user_prompt": user_prompt}).encode("utf-8"))
+
+
+def test_local_answer():
+    status, headers, data = post("I am 175 cm and 70 kg")
+    assert status == 200
+    assert headers[b"x-tip-mode"] == b"BMI"
+    assert data["response"].startswith("- Your BMI is 22.9")
+
+
+def test_upstream_answer_is_cached():
+    status, headers, data = post("my knee feels stiff every morning")
+    assert (status, data["response"]) == (200, stub_upstream.STUB_TIP)
+    assert headers[b"x-tip-mode"] == b"SYMPTOM"
+    assert asgi.pipeline.cached_answer("my knee feels stiff every morning") == stub_upstream.STUB_TIP
+
+
+def test_bad_requests():
+    assert call("POST", "/healthtip", b"not json")[0] == 400
+    assert call("POST", "/healthtip", b"[1]")[0] == 400
+    assert call("GET", "/healthtip")[0] == 405
+    assert call("GET", "/nowhere")[0] == 404
+
+
+def test_readiness():
+    status, _, data = call("GET", "/readyz")
+    assert (status, data["status"]) == (200, "ready")
+
+
+def test_flight_stops_at_the_deadline(monkeypatch, slow_upstream_server):
+    monkeypatch.setattr(asgi.upstream, "OPENROUTER_URL", stub_url(slow_upstream_server))
+
+    async def run():
+        try:
+            await asgi.fetch_model("my knee feels stiff every morning", "SYMPTOM", None, Deadline(0.3))
+        finally:
+            await asgi.close_client()
+
+    start = time.monotonic()
+    with pytest.raises((httpx.TimeoutException, DeadlineExceeded)):
+        asyncio.run(run())
+    # Well before the stub's one second reply, let alone the client's
+    # default read timeout
+    assert time.monotonic() - start < 0.9
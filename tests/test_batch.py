@@ -0,0 +1,32 @@
+import app
+import pipeline
+import stub_upstream
+
+
+def batch(user_prompts):
+    return app.app.test_client().post("/healthtip/batch", json={"user_prompts": user_prompts})
+
+
+def test_results_keep_input_order():
+    response = batch(["I am 175 cm and 70 kg", "my knee feels stiff every morning", 42, "hi"])
+    assert response.status_code == 200
+    results = response.json["results"]
+    assert [result["source"] for result in results] == ["local", "upstream", None, "local"]
+    assert results[1]["response"] == stub_upstream.STUB_TIP
+    assert results[2]["status"] == "invalid_input"
+
+
+def test_cache_is_read_and_written_once_per_batch():
+    prompts = ["my knee feels stiff every morning", "my elbow clicks when I lift things"]
+    batch(prompts)
+    latency = pipeline.response_cache.stats()["latency"]
+    assert latency["get_many"]["calls"] == 1
+    assert latency["set_many"]["calls"] == 1
+    assert "set" not in latency
+    results = batch(prompts).json["results"]
+    assert [result["source"] for result in results] == ["cache", "cache"]
+
+
+def test_bad_batches():
+    assert batch("not a list").status_code == 400
+    assert batch(["hi"] * (app.BATCH_MAX_ITEMS + 1)).status_code == 400
@@ -0,0 +1,70 @@
+import io
+import json
+
+import pytest
+
+import bulk
+
+
+def run(open_rows, data, render):
+    columns, rows = open_rows(bulk.read_lines(io.BytesIO(data), chunk_bytes=7))
+    return "".join(render(bulk.results(columns, rows, block_rows=2)))
+
+
+def test_csv():
+    data = "﻿id,height_cm,weight_kg\r\na,175,70\r\nb,,80\r\n\"c,d\",160,50\r\n".encode("utf-8")
+    assert run(bulk.open_csv, data, bulk.render_csv).split("\r\n") == [
+        "row,id,bmi,category,error",
+        "1,a,22.9,Normal,",
+        "2,b,,,invalid height or weight",
+        '3,"c,d",19.5,Normal,',
+        ""
+    ]
+
+
+def test_csv_units_from_column_names():
+    data = b"height_in,weight_lb\n69,154\n"
+    assert run(bulk.open_csv, data, bulk.render_csv).split("\r\n")[1] == "1,,22.7,Normal,"
+
+
+def test_ndjson():
+    data = b'{"id": 1, "height_m": 1.8, "weight_kg": 90}\nnot json\n{"id": 3, "height_m": 1.6}\n'
+    rows = [json.loads(line) for line in run(bulk.open_ndjson, data, bulk.render_ndjson).splitlines()]
+    assert rows[0] == {"row": 1, "id": 1, "bmi": 27.8, "category": "High"}
+    assert rows[1]["error"] and rows[2]["error"]
+
+
+def test_bad_bytes_fail_one_row():
+    data = b"height_cm,weight_kg\n17\xff5,70\n160,50\n"
+    lines = run(bulk.open_csv, data, bulk.render_csv).split("\r\n")
+    assert lines[1].endswith("invalid height or weight")
+    assert lines[2] == "2,,19.5,Normal,"
+
+
+def test_stray_quote_fails_one_row():
+    data = b'id,height_cm,weight_kg\n"a,175,70\nb,175,70\nc,160,50\n'
+    lines = run(bulk.open_csv, data, bulk.render_csv).split("\r\n")
+    assert lines[1:4] == ["1,,,,invalid height or weight", "2,b,22.9,Normal,", "3,c,19.5,Normal,"]
+
+
+def test_carriage_return_line_ends():
+    data = b"height_cm,weight_kg\r175,70\r160,50\r"
+    assert run(bulk.open_csv, data, bulk.render_csv).split("\r\n")[1:3] == ["1,,22.9,Normal,", "2,,19.5,Normal,"]
+
+
+def test_overlong_line_is_skipped():
+    data = b"height_cm,weight_kg\n" + b"1" * 100 + b"\n175,70\n"
+    lines = list(bulk.read_lines(io.BytesIO(data), chunk_bytes=8, max_line_bytes=32))
+    assert lines == ["height_cm,weight_kg", None, "175,70"]
+
+
+def test_missing_columns():
+    with pytest.raises(bulk.BulkError):
+        bulk.open_csv(bulk.read_lines(io.BytesIO(b"name,age\nx,1\n")))
+
+
+def test_numpy_matches_bmi_compute(monkeypatch):
+    heights, weights = ["175", "160", "x", "300"], ["70", "50", "60", "70"]
+    fast = bulk.compute(heights, weights, 0.01, 1.0)
+    monkeypatch.setattr(bulk, "np", None)
+    assert bulk.compute(heights, weights, 0.01, 1.0) == fast
@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+
+import cache
+import resp
+import semantic
+
+
+def test_lru_hit_and_expiry(monkeypatch):
+    lru = cache.LRUCache(max_entries=2, ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    lru.set("a", "reply")
+    assert lru.get("a") == "reply"
+    now[0] += 11
+    assert lru.get("a") is None
+    assert lru.get_stale("a") == "reply"
+
+
+def test_lru_evicts_least_recently_used():
+    lru = cache.LRUCache(max_entries=2, ttl=60)
+    lru.set("a", "1")
+    lru.set("b", "2")
+    lru.get("a")
+    lru.set("c", "3")
+    assert lru.get("b") is None
+    assert lru.get("a") == "1"
+
+
+def test_sqlite_hit_and_expiry(tmp_path, monkeypatch):
+    store = cache.SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=2, ttl=10)
+    store.set("a", "reply")
+    assert store.get("a") == "reply"
+    later = cache.time.time() + 11
+    monkeypatch.setattr(cache.time, "time", lambda: later)
+    assert store.get("a") is None
+    assert store.get_stale("a") == "reply"
+
+
+def test_sqlite_locked_file_is_a_miss(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    store = cache.SQLiteCache(path, ttl=60, timeout=0.05)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        store.set("a", "reply")
+        assert store.get("a") is None
+    finally:
+        other.execute("ROLLBACK")
+    assert store.stats()["errors"] == 1
+
+
+def test_redis_round_trip(redis_server):
+    host, port = redis_server.server_address[:2]
+    store = cache.RedisCache(resp.RedisClient(f"redis://{host}:{port}/0", 1.0), ttl=60)
+    store.clear()
+    store.set_many([("a", "first"), ("b", "second")])
+    assert store.get_many(["a", "b", "c"]) == ["first", "second", None]
+    assert store.stats()["hits"] == 2
+
+
+def test_redis_down_is_a_miss():
+    store = cache.RedisCache(resp.RedisClient("redis://127.0.0.1:1/0", 0.1), ttl=60)
+    assert store.get("a") is None
+    store.set("a", "reply")
+    assert store.stats()["errors"] >= 2
+
+
+@pytest.mark.skipif(semantic.np is None, reason="needs numpy")
+def test_semantic_paraphrase_and_expiry(monkeypatch):
+    paraphrases = semantic.SemanticCache(threshold=0.8, max_entries=4, ttl=10)
+    paraphrases.set("i have a fever", "reply")
+    assert paraphrases.get("I have got a fever") == "reply"
+    later = semantic.time.time() + 11
+    monkeypatch.setattr(semantic.time, "time", lambda: later)
+    assert paraphrases.get("I have got a fever") is None
@@ -0,0 +1,48 @@
+import pytest
+
+import app
+import pipeline
+import router
+import stub_upstream
+import upstream
+from deadline import Deadline
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    # The reply each model gives, instead of the stub's
+    by_model = {}
+    calls = []
+
+    def fetch_message(payload, deadline=None):
+        calls.append(payload["model"])
+        return by_model.get(payload["model"], stub_upstream.STUB_TIP)
+
+    monkeypatch.setattr(upstream, "fetch_message", fetch_message)
+    monkeypatch.setattr(pipeline, "MODEL_CASCADE", True)
+    monkeypatch.setattr(pipeline, "_cascade", {"answered_by_tier": {}, "escalations": 0})
+    return by_model, calls
+
+
+def test_small_model_answers_when_its_reply_is_usable(replies):
+    _, calls = replies
+    assert app.fetch_tip("knee pain", "SYMPTOM", Deadline()) == stub_upstream.STUB_TIP
+    assert calls == [router.SMALL_MODEL]
+    assert pipeline.cascade_stats()["answered_by_tier"] == {router.SMALL_MODEL: 1}
+
+
+def test_unusable_reply_escalates(replies):
+    by_model, calls = replies
+    by_model[router.SMALL_MODEL] = "- only\n- two"
+    assert app.fetch_tip("knee pain", "SYMPTOM", Deadline()) == stub_upstream.STUB_TIP
+    assert calls == [router.SMALL_MODEL, router.LARGE_MODEL]
+    stats = pipeline.cascade_stats()
+    assert stats["escalations"] == 1
+    assert stats["answered_by_tier"] == {router.LARGE_MODEL: 1}
+
+
+def test_repairable_reply_does_not_escalate(replies):
+    by_model, calls = replies
+    by_model[router.SMALL_MODEL] = "Here are your tips:\n" + stub_upstream.STUB_TIP
+    assert app.fetch_tip("knee pain", "SYMPTOM", Deadline()) == stub_upstream.STUB_TIP
+    assert calls == [router.SMALL_MODEL]
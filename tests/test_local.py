@@ -0,0 +1,83 @@
+import pytest
+
+import canned
+import classifier
+import knowledge
+import pipeline
+from prompts import INVALID_RESPONSE
+
+
+def test_bmi_answered_locally():
+    result, tip = pipeline.local_answer("I am 175 cm tall and weigh 70 kg")
+    assert result.mode == classifier.BMI
+    assert tip.startswith("- Your BMI is 22.9")
+
+
+@pytest.mark.parametrize("user_input", ["5'9\" and 154 lbs", "1m75, 11 st"])
+def test_bmi_in_other_units(user_input):
+    result, tip = pipeline.local_answer(user_input)
+    assert result.mode == classifier.BMI and result.confident
+    assert tip is not None
+
+
+@pytest.mark.parametrize("user_input", ["", "   ", "hi", "Hello there!", "thanks", "tell me a joke"])
+def test_invalid_answered_locally(user_input):
+    result, tip = pipeline.local_answer(user_input)
+    assert result.mode == classifier.INVALID and result.confident
+    assert tip == INVALID_RESPONSE
+
+
+@pytest.mark.parametrize("user_input", [
+    "I have covid", "I threw up", "I had a seizure", "I'm pregnant", "I want to kill myself",
+    "Can I take codeine?", "is codeine safe", "stockings for varicose veins",
+    "Is a gamey taste in my mouth normal"
+])
+def test_unknown_health_words_go_upstream(user_input):
+    _, tip = pipeline.local_answer(user_input)
+    assert tip is None
+
+
+def test_knowledge_base_answers_covered_symptoms():
+    result, tip = pipeline.local_answer("I have a bad hedache")
+    assert result.mode == classifier.SYMPTOM
+    assert len(tip.split("\n")) == 4
+
+
+def test_red_flags_go_upstream():
+    _, tip = pipeline.local_answer("headache and chest pain")
+    assert tip is None
+
+
+@pytest.mark.parametrize("user_input", ["it is cold", "I'm cold", "I feel cold"])
+def test_feeling_cold_is_not_a_cold(user_input):
+    assert knowledge.lookup(user_input) is None
+
+
+def test_a_cold_answered_locally():
+    _, tip = pipeline.local_answer("I have a cold")
+    assert "saline nose drops" in tip
+
+
+def test_negated_symptoms_are_left_out():
+    assert knowledge.lookup("I don't have a fever") is None
+    match = knowledge.lookup("headache but no fever")
+    assert match.symptoms == ["headache"] and not match.covered
+
+
+def test_fallback_skips_negated_symptoms():
+    result, _ = pipeline.local_answer("I don't have a fever")
+    assert pipeline.fallback_answer("I don't have a fever", result) == canned.GENERAL_TIPS
+
+
+@pytest.mark.parametrize("typo, word", [("hedache", "headache"), ("feaver", "fever"), ("nausia", "nausea")])
+def test_typos_are_corrected(typo, word):
+    assert knowledge.correct_word(typo) == word
+
+
+@pytest.mark.parametrize("word", ["couch", "tires", "heated", "header", "sever", "painting", "never"])
+def test_real_words_are_not_corrected(word):
+    assert knowledge.correct_word(word) == word
+
+
+def test_couch_is_not_a_cough():
+    assert pipeline.local_answer("my couch is broken")[1] is None
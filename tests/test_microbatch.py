@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import microbatch
+import pipeline
+import stub_upstream
+from deadline import Deadline
+
+
+def batcher(send, validate=None, max_items=8):
+    return microbatch.MicroBatcher(send, window=0.2, max_items=max_items, validate=validate)
+
+
+def submit_all(micro, user_inputs):
+    with ThreadPoolExecutor(len(user_inputs)) as pool:
+        return list(pool.map(lambda user_input: micro.submit("SYMPTOM", user_input, Deadline(2)), user_inputs))
+
+
+def test_concurrent_prompts_share_one_call():
+    sent = []
+
+    def send(key, user_inputs, deadline):
+        sent.append(list(user_inputs))
+        return [f"reply to {user_input}" for user_input in user_inputs]
+
+    micro = batcher(send, max_items=3)
+    assert submit_all(micro, ["a", "b", "c"]) == ["reply to a", "reply to b", "reply to c"]
+    assert len(sent) == 1 and sorted(sent[0]) == ["a", "b", "c"]
+    assert micro.stats()["batches"] == 1
+
+
+def test_batch_of_one_makes_its_own_call():
+    micro = batcher(lambda key, user_inputs, deadline: ["unused"])
+    assert micro.submit("SYMPTOM", "a", Deadline(2)) is None
+
+
+def test_invalid_and_failed_replies_fall_back_to_own_call():
+    micro = batcher(lambda key, user_inputs, deadline: ["ok", "bad"], validate=lambda reply: reply == "ok", max_items=2)
+    assert sorted(submit_all(micro, ["a", "b"]), key=str) == [None, "ok"]
+
+    def fail(key, user_inputs, deadline):
+        raise ConnectionError()
+
+    assert submit_all(batcher(fail, max_items=2), ["a", "b"]) == [None, None]
+
+
+def test_parse_replies():
+    assert microbatch.parse_replies('```json\n{"1": " a ", "3": "c"}\n```', 3) == ["a", None, "c"]
+    assert microbatch.parse_replies("not json", 2) == [None, None]
+
+
+def test_send_micro_batch_against_stub():
+    replies = pipeline.send_micro_batch("SYMPTOM", ["knee pain", "back pain"], Deadline(2))
+    assert replies == [stub_upstream.STUB_TIP, stub_upstream.STUB_TIP]
@@ -0,0 +1,45 @@
+import output
+from prompts import INVALID_RESPONSE
+
+TIP = "- a\n- b\n- c\n- d"
+
+
+def test_compliant_reply_is_untouched():
+    assert output.repair(TIP) == (TIP, output.COMPLIANT)
+    assert output.repair(INVALID_RESPONSE) == (INVALID_RESPONSE, output.COMPLIANT)
+
+
+def test_intro_closer_and_markers_are_repaired():
+    reply = "Here are your tips:\n\n* a\n• b\n1. c\n2) d\n\nStay healthy!"
+    assert output.repair(reply) == (TIP, output.REPAIRED)
+
+
+def test_bold_heading_is_not_a_bullet():
+    assert output.normalize_line("**Tips**") is None
+    assert output.normalize_line("- **Tips**") is None
+    assert output.repair("**Tips**\n- a\n- b\n- c\n- d") == (TIP, output.REPAIRED)
+
+
+def test_wrapped_fourth_bullet_is_kept():
+    reply = "- a\n- b\n- c\n- Contact your doctor if it lasts more than\nthree days."
+    text, status = output.repair(reply)
+    assert status == output.REPAIRED
+    assert text.endswith("- Contact your doctor if it lasts more than three days.")
+
+
+def test_closer_after_last_bullet_is_dropped():
+    assert output.repair(TIP + "\nStay healthy and take care!") == (TIP, output.REPAIRED)
+    tip = TIP.replace("- d", "- d.")
+    assert output.repair(tip + "\nthis is not medical advice") == (tip, output.REPAIRED)
+
+
+def test_extra_bullets_are_dropped():
+    assert output.repair(TIP + "\n- e") == (TIP, output.REPAIRED)
+
+
+def test_too_few_bullets_fail():
+    assert output.repair("- a\n- b").status == output.FAILED
+
+
+def test_quoted_invalid_sentence():
+    assert output.repair(f'"{INVALID_RESPONSE}"') == (INVALID_RESPONSE, output.REPAIRED)
@@ -0,0 +1,58 @@
+import prompts
+import stub_upstream
+import upstream
+
+
+class FakeResponse:
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        if isinstance(self._data, Exception):
+            raise self._data
+        return self._data
+
+
+def test_system_and_user_messages():
+    first = upstream.build_payload("  knee pain  ", "model", "SYMPTOM")
+    second = upstream.build_payload("back pain", "model", "SYMPTOM")
+    assert [message["role"] for message in first["messages"]] == ["system", "user"]
+    assert first["messages"][1]["content"] == "knee pain"
+    # Identical instructions, so providers can cache the prefix
+    assert first["messages"][0] == second["messages"][0]
+    assert first["usage"] == {"include": True}
+
+
+def test_numbers_keep_the_full_prompt(monkeypatch):
+    monkeypatch.setattr(prompts, "COMPACT_PROMPTS", True)
+    assert prompts.system_prompt("SYMPTOM", "knee pain") == prompts.PROMPTS["SYMPTOM"]
+    assert prompts.system_prompt("SYMPTOM", "I weigh 70") == prompts.COPSTAR_PROMPT
+    assert len(prompts.PROMPTS["SYMPTOM"]) < len(prompts.COPSTAR_PROMPT)
+
+
+def test_usage_is_counted():
+    before = upstream.stats()
+    message = upstream.extract_message(FakeResponse({
+        "choices": [{"message": {"content": "<s> - a\n- b\n- c\n- d </s>"}}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "prompt_tokens_details": {"cached_tokens": 80}}
+    }))
+    after = upstream.stats()
+    assert message == "- a\n- b\n- c\n- d"
+    assert after["prompt_tokens"] - before["prompt_tokens"] == 100
+    assert after["completion_tokens"] - before["completion_tokens"] == 20
+    assert after["cached_tokens"] - before["cached_tokens"] == 80
+
+
+def test_malformed_completions():
+    assert upstream.extract_message(FakeResponse(ValueError("not json"))) == upstream.ERROR_RESPONSE
+    assert upstream.extract_message(FakeResponse({"choices": []})) == upstream.ERROR_RESPONSE
+    assert upstream.extract_message(FakeResponse({"choices": [{"message": {"content": None}}]})) == upstream.ERROR_RESPONSE
+
+
+def test_repeated_system_prompt_is_reported_cached():
+    before = upstream.stats()["cached_tokens"]
+    payload = upstream.build_payload("knee pain", "model", "SYMPTOM")
+    assert upstream.complete(payload) == stub_upstream.STUB_TIP
+    upstream.complete(payload)
+    assert upstream.stats()["cached_tokens"] > before
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+import retry
+import upstream
+from deadline import Deadline
+
+
+def policy(**kwargs):
+    return retry.RetryPolicy((ConnectionError, upstream.UpstreamError), base_delay=0.01, max_delay=0.02, **kwargs)
+
+
+def flaky(errors):
+    # fn that raises each of errors in turn, then succeeds
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return "reply"
+
+    return fn, calls
+
+
+def test_parse_retry_after():
+    assert retry.parse_retry_after("3") == 3.0
+    assert retry.parse_retry_after("-1") == 0.0
+    assert retry.parse_retry_after("soon") is None
+    assert retry.parse_retry_after(None) is None
+    when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 <= retry.parse_retry_after(when) <= 30
+
+
+def test_status_error_carries_retry_after():
+    response = SimpleNamespace(status_code=429, headers={"Retry-After": "2"})
+    error = upstream.status_error(response)
+    assert (error.status, error.retry_after) == (429, 2.0)
+
+
+def test_transient_errors_are_retried():
+    fn, calls = flaky([ConnectionError(), upstream.UpstreamError("HTTP 503", 503)])
+    retries = policy()
+    assert retries.run(fn, Deadline(2)) == "reply"
+    assert len(calls) == 3
+    assert retries.stats()["retries"] == 2
+
+
+def test_client_errors_are_not_retried():
+    fn, calls = flaky([upstream.UpstreamError("HTTP 400", 400)])
+    retries = policy()
+    with pytest.raises(upstream.UpstreamError):
+        retries.run(fn, Deadline(2))
+    assert len(calls) == 1
+    assert retries.stats()["not_retriable"] == 1
+
+
+def test_attempts_are_limited():
+    fn, calls = flaky([ConnectionError()] * 5)
+    with pytest.raises(ConnectionError):
+        policy(max_attempts=3).run(fn, Deadline(2))
+    assert len(calls) == 3
+
+
+def test_retry_after_is_honoured_within_the_deadline():
+    retries = policy()
+    assert retries.next_delay(1, upstream.UpstreamError("HTTP 429", 429, 0.5), remaining=2) >= 0.5
+    assert retries.next_delay(1, upstream.UpstreamError("HTTP 429", 429, 5), remaining=2) is None
+    assert retries.stats()["no_time"] == 1
+
+
+def test_budget_limits_retries_to_a_share_of_traffic():
+    retries = policy(budget=retry.RetryBudget(ratio=0.5, initial=0))
+    retries.start()
+    assert retries.next_delay(1, ConnectionError(), remaining=2) is None
+    retries.start()
+    assert retries.next_delay(1, ConnectionError(), remaining=2) is not None
+    assert retries.stats()["budget_exhausted"] == 1
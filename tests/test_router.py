@@ -0,0 +1,43 @@
+import pytest
+
+import router
+
+SMALL, LARGE = router.SMALL_MODEL, router.LARGE_MODEL
+
+
+@pytest.fixture
+def routes(monkeypatch):
+    monkeypatch.setattr(router, "EXPLORE_RATE", 0.0)
+    return router.Router({"SYMPTOM": [SMALL, LARGE], "BMI": [LARGE]})
+
+
+def test_untried_models_go_first(routes):
+    assert routes.choose("SYMPTOM") == SMALL
+    routes.record(SMALL, 1.0, True)
+    assert routes.choose("SYMPTOM") == LARGE
+
+
+def test_unknown_mode_uses_the_large_model(routes):
+    assert routes.choose("NOPE") == LARGE
+
+
+def test_faster_later_model_wins(routes):
+    routes.record(SMALL, 3.0, True)
+    routes.record(LARGE, 1.0, True)
+    assert routes.choose("SYMPTOM") == LARGE
+
+
+def test_order_breaks_near_ties(routes):
+    routes.record(SMALL, 1.1, True)
+    routes.record(LARGE, 1.0, True)
+    assert routes.choose("SYMPTOM") == SMALL
+
+
+def test_model_that_always_fails_is_avoided(routes):
+    chosen = []
+    for _ in range(50):
+        model = routes.choose("SYMPTOM")
+        chosen.append(model)
+        routes.record(model, 1.5, model != SMALL)
+    assert chosen.count(SMALL) <= 2
+    assert routes.stats()["models"][SMALL]["ewma_latency_ms"] is None
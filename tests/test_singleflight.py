@@ -0,0 +1,64 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import singleflight
+
+
+def slow(calls, value="reply", delay=0.1):
+    def fn():
+        calls.append(1)
+        time.sleep(delay)
+        return value
+    return fn
+
+
+def test_concurrent_callers_share_one_call():
+    group = singleflight.Group()
+    calls = []
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: group.do("key", slow(calls)), range(8)))
+    assert results == ["reply"] * 8
+    assert len(calls) == 1
+    assert group.stats()["shared"] == 7
+
+
+def test_errors_reach_every_caller():
+    group = singleflight.Group()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("upstream")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(group.do, "key", fail)
+        started.wait()
+        follower = pool.submit(group.do, "key", fail)
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result()
+
+
+def test_follower_gives_up_at_its_timeout():
+    group = singleflight.Group()
+    with ThreadPoolExecutor(2) as pool:
+        pool.submit(group.do, "key", slow([], delay=0.5))
+        time.sleep(0.05)
+        with pytest.raises(TimeoutError):
+            group.do("key", slow([]), timeout=0.05)
+
+
+@pytest.mark.skipif(singleflight.fcntl is None, reason="needs fcntl")
+def test_workers_share_through_the_directory(tmp_path):
+    # Two groups stand in for two workers on one machine
+    first = singleflight.Group(str(tmp_path))
+    second = singleflight.Group(str(tmp_path))
+    calls = []
+    assert first.do("key", slow(calls, "from first")) == "from first"
+    assert second.do("key", slow(calls, "from second")) == "from first"
+    assert len(calls) == 1
+    assert second.stats()["shared_across_workers"] == 1
@@ -0,0 +1,41 @@
+import json
+
+import app
+import pipeline
+import stub_upstream
+import upstream
+
+
+def events(user_prompt):
+    # [(event, data)] from /healthtip/stream
+    response = app.app.test_client().post("/healthtip/stream", json={"user_prompt": user_prompt})
+    assert response.mimetype == "text/event-stream"
+    parsed = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        parsed.append((fields.get("event"), json.loads(fields["data"])))
+    return parsed
+
+
+def lines(parsed):
+    return "\n".join(data["line"] for event, data in parsed if event is None)
+
+
+def test_local_answer_is_streamed():
+    parsed = events("I am 175 cm and 70 kg")
+    assert lines(parsed).startswith("- Your BMI is 22.9")
+    assert parsed[-1] == ("done", {"mode": "BMI"})
+
+
+def test_upstream_answer_is_streamed_and_cached():
+    parsed = events("my knee feels stiff every morning")
+    assert lines(parsed) == stub_upstream.STUB_TIP
+    assert parsed[-1] == ("done", {"mode": "SYMPTOM"})
+    assert pipeline.cached_answer("my knee feels stiff every morning") == stub_upstream.STUB_TIP
+
+
+def test_falls_back_when_upstream_is_down(monkeypatch):
+    monkeypatch.setattr(upstream, "OPENROUTER_URL", "http://127.0.0.1:1/api/v1/chat/completions")
+    parsed = events("my knee feels stiff every morning")
+    assert len(lines(parsed).split("\n")) == 4
+    assert parsed[-1][0] == "done"
@@ -0,0 +1,49 @@
+import pytest
+
+import upstream
+from prompts import INVALID_RESPONSE
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    # Replaces the upstream stream with the given text deltas and records
+    # whether the stream was closed early
+    state = {"chunks": [], "read": 0}
+
+    def stream_completion(payload, deadline=None):
+        for chunk in state["chunks"]:
+            state["read"] += 1
+            yield chunk
+
+    monkeypatch.setattr(upstream, "stream_completion", stream_completion)
+    monkeypatch.setattr(upstream, "EARLY_STOP", True)
+    return state
+
+
+def test_stops_after_fourth_bullet(chunks):
+    chunks["chunks"] = ["- a.\n- b.\n", "- c.\n- d.\n", "- e.\n", "padding"]
+    assert upstream.fetch_message({}) == "- a.\n- b.\n- c.\n- d."
+    assert chunks["read"] == 2
+
+
+def test_wrapped_fourth_bullet_is_read_whole(chunks):
+    chunks["chunks"] = [
+        "- a.\n- b.\n- c\n- Contact your doctor if it lasts more than\n",
+        "three days.\n",
+        "Stay well!\n"
+    ]
+    assert upstream.fetch_message({}).endswith("- Contact your doctor if it lasts more than three days.")
+    assert chunks["read"] == 2
+
+
+def test_unpunctuated_fourth_bullet_ends_at_next_line(chunks):
+    chunks["chunks"] = ["- a\n- b\n- c\n- d\n", "Take care!\n", "more"]
+    assert upstream.fetch_message({}) == "- a\n- b\n- c\n- d"
+    assert chunks["read"] == 2
+
+
+def test_split_markup_and_invalid_sentence(chunks):
+    sentence = INVALID_RESPONSE
+    chunks["chunks"] = ["<", "s>" + sentence[:10], sentence[10:], " extra"]
+    assert upstream.fetch_message({}) == INVALID_RESPONSE
+    assert chunks["read"] == 3
@@ -0,0 +1,69 @@
+import time
+
+import app
+import breaker
+import pipeline
+import stub_upstream
+import upstream
+from deadline import Deadline
+
+from conftest import stub_url
+
+
+def test_upstream_reply_is_cached():
+    mode, reply, source = app.generate_tip("my knee feels stiff every morning")
+    assert (mode, reply, source) == ("SYMPTOM", stub_upstream.STUB_TIP, "upstream")
+    _, reply, source = app.generate_tip("My knee feels stiff every morning.")
+    assert (reply, source) == (stub_upstream.STUB_TIP, "cache")
+
+
+def test_healthtip_endpoint():
+    client = app.app.test_client()
+    response = client.post("/healthtip", json={"user_prompt": "I am 180 cm and 81 kg"})
+    assert response.status_code == 200
+    assert response.headers["X-Tip-Mode"] == "BMI"
+    assert response.json["response"].startswith("- Your BMI is 25.0")
+
+
+def test_missed_deadline_falls_back(monkeypatch, slow_upstream_server):
+    monkeypatch.setattr(upstream, "OPENROUTER_URL", stub_url(slow_upstream_server))
+    start = time.monotonic()
+    _, reply, source = app.generate_tip("my knee feels stiff every morning", Deadline(0.3))
+    assert source == "fallback"
+    assert len(reply.split("\n")) == 4
+    assert time.monotonic() - start < 1.0
+
+
+def test_open_circuit_degrades(monkeypatch):
+    monkeypatch.setattr(upstream, "OPENROUTER_URL", "http://127.0.0.1:1/api/v1/chat/completions")
+    # The retries can open the circuit within this first request
+    _, _, source = app.generate_tip("my knee feels stiff every morning", Deadline(2))
+    assert source in ("fallback", "degraded")
+    assert pipeline.circuit.state == breaker.OPEN
+    _, _, source = app.generate_tip("my knee feels stiff every morning", Deadline(2))
+    assert source == "degraded"
+
+
+def test_breaker_half_open_probe():
+    circuit = breaker.CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    circuit.record_failure()
+    assert circuit.state == breaker.CLOSED
+    circuit.record_failure()
+    assert circuit.state == breaker.OPEN
+    assert not circuit.allow()
+    time.sleep(0.06)
+    assert circuit.state == breaker.HALF_OPEN
+    assert circuit.allow()
+    assert not circuit.allow()
+    circuit.record_failure()
+    assert circuit.state == breaker.OPEN
+    time.sleep(0.06)
+    assert circuit.allow()
+    circuit.record_success()
+    assert circuit.state == breaker.CLOSED
+
+
+def test_admin_closed_without_token(monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", None)
+    client = app.app.test_client()
+    assert client.delete("/admin/cache").status_code == 404
@@ -0,0 +1,312 @@
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from deadline import Deadline
+from output import BULLET_COUNT, SENTENCE_END_RE, continues, normalize_line
+from prompts import INVALID_RESPONSE, build_batch_messages, build_messages
+from retry import parse_retry_after
+
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# Hosts kept in the pool, and sockets kept open per host
+POOL_CONNECTIONS = int(os.getenv("UPSTREAM_POOL_CONNECTIONS", "2"))
+POOL_MAXSIZE = int(os.getenv("UPSTREAM_POOL_MAXSIZE", "8"))
+
+# Stop reading (and cancel the generation) once the reply is complete
+EARLY_STOP = os.getenv("UPSTREAM_EARLY_STOP", "1") == "1"
+
+MODEL = "mistralai/mistral-large-2411"
+MAX_TOKENS = 220
+TEMPERATURE = 0.4
+ERROR_RESPONSE = "Unable to generate response."
+
+HEADERS = {
+    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+    "Content-Type": "application/json"
+}
+
+class UpstreamError(Exception):
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        # Seconds the server asked us to wait, from Retry-After
+        self.retry_after = retry_after
+
+
+def status_error(response):
+    # Works for both requests and httpx responses
+    return UpstreamError(
+        f"HTTP {response.status_code}",
+        response.status_code,
+        parse_retry_after(response.headers.get("Retry-After"))
+    )
+
+
+_lock = threading.Lock()
+_state = {
+    "pid": None,
+    "session": None,
+    "adapter": None,
+    "requests": 0,
+    "early_stops": 0,
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+    "cached_tokens": 0
+}
+
+
+def _new_session():
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        pool_block=False
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HEADERS)
+    return session, adapter
+
+
+def build_payload(user_input, model=MODEL, mode=None):
+    return {
+        "model": model,
+        "messages": build_messages(user_input, mode),
+        "max_tokens": MAX_TOKENS,
+        "temperature": TEMPERATURE,
+        # Ask OpenRouter to report token usage, including cached tokens
+        "usage": {"include": True}
+    }
+
+
+def build_batch_payload(user_inputs, model=MODEL):
+    return {
+        "model": model,
+        "messages": build_batch_messages(user_inputs),
+        # JSON quoting adds some overhead on top of the per-reply budget
+        "max_tokens": MAX_TOKENS * len(user_inputs) + 50,
+        "temperature": TEMPERATURE,
+        "usage": {"include": True}
+    }
+
+
+def clean_message(text):
+    # Clean unwanted tokens
+    return text.replace("<s>", "").replace("</s>", "").strip()
+
+
+def record_usage(usage):
+    if not isinstance(usage, dict):
+        return
+    details = usage.get("prompt_tokens_details") or {}
+    with _lock:
+        _state["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        _state["completion_tokens"] += usage.get("completion_tokens") or 0
+        _state["cached_tokens"] += details.get("cached_tokens") or 0
+
+
+def extract_message(response):
+    # Works for both requests and httpx responses
+    try:
+        data = response.json()
+        record_usage(data.get("usage"))
+        ai_msg = data["choices"][0]["message"]["content"].strip()
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        ai_msg = ERROR_RESPONSE
+    return clean_message(ai_msg)
+
+
+def get_session():
+    # gunicorn forks workers after import, so a session is only reused
+    # inside the process that created it
+    pid = os.getpid()
+    if _state["pid"] != pid:
+        with _lock:
+            if _state["pid"] != pid:
+                session, adapter = _new_session()
+                _state.update(
+                    pid=pid,
+                    session=session,
+                    adapter=adapter,
+                    requests=0,
+                    early_stops=0,
+                    prompt_tokens=0,
+                    completion_tokens=0,
+                    cached_tokens=0
+                )
+    return _state["session"]
+
+
+def complete(payload, deadline=None):
+    # Non-streamed completion, for replies that are only usable whole
+    deadline = deadline or Deadline()
+    session = get_session()
+    with _lock:
+        _state["requests"] += 1
+    response = session.post(OPENROUTER_URL, json=payload, timeout=deadline.timeouts())
+    if response.status_code != 200:
+        raise status_error(response)
+    ai_msg = extract_message(response)
+    if ai_msg == ERROR_RESPONSE:
+        raise UpstreamError("Malformed completion")
+    return ai_msg
+
+
+def stream_completion(payload, deadline=None):
+    # Yields text deltas from a streamed completion. Closing the generator
+    # closes the response, which cancels the generation upstream.
+    deadline = deadline or Deadline()
+    session = get_session()
+    with _lock:
+        _state["requests"] += 1
+    response = session.post(
+        OPENROUTER_URL,
+        json={**payload, "stream": True},
+        stream=True,
+        timeout=deadline.timeouts()
+    )
+    try:
+        if response.status_code != 200:
+            raise status_error(response)
+        done = False
+        # Reading through to the end of the body after [DONE] lets urllib3
+        # hand the connection back to the pool
+        for line in response.iter_lines(chunk_size=1024):
+            # The read timeout is per socket read, so a slow drip of chunks
+            # is cut off here instead
+            deadline.check()
+            # Blank keep-alives and ": OPENROUTER PROCESSING" comments
+            if done or not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                done = True
+                continue
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            # Usage arrives on the last chunk, with empty choices
+            if isinstance(chunk, dict):
+                record_usage(chunk.get("usage"))
+            try:
+                text = chunk["choices"][0]["delta"].get("content")
+            except (KeyError, IndexError, TypeError, AttributeError):
+                continue
+            if text:
+                yield text
+    finally:
+        response.close()
+
+
+def _early_stop():
+    with _lock:
+        _state["early_stops"] += 1
+
+
+def _stream_text_lines(stream):
+    # Re-chunks the stream into cleaned lines. Cleaning whole lines means a
+    # "<s>" split across two deltas is still removed. The INVALID sentence
+    # is passed on as soon as it is in, without waiting for a newline.
+    buffer = ""
+    for text in stream:
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield clean_message(line)
+        if EARLY_STOP and INVALID_RESPONSE in buffer:
+            break
+    yield clean_message(buffer)
+
+
+def _whole_lines(lines):
+    # Drops blank lines and joins wrapped bullets. A bullet that stops
+    # mid-sentence is held back until the next line shows whether it
+    # goes on, so every bullet passed on is complete.
+    held = None
+    for line in lines:
+        if held is not None:
+            if continues(held, line):
+                held += " " + line
+                if SENTENCE_END_RE.search(held):
+                    yield held
+                    held = None
+                continue
+            yield held
+            held = None
+        if not line:
+            continue
+        if normalize_line(line) is not None and SENTENCE_END_RE.search(line) is None:
+            held = line
+        else:
+            yield line
+    if held is not None:
+        yield held
+
+
+def stream_lines(payload, deadline=None):
+    # Cleaned, non-blank output lines, each bullet whole.
+    #
+    # With EARLY_STOP the stream is closed as soon as the fourth bullet is
+    # complete or the INVALID sentence is, instead of waiting for the
+    # model to pad out to max_tokens. Closing mid-stream costs the pooled
+    # connection, which is cheaper than the tokens it saves.
+    bullets = 0
+    stream = stream_completion(payload, deadline)
+    try:
+        for line in _whole_lines(_stream_text_lines(stream)):
+            if EARLY_STOP and INVALID_RESPONSE in line:
+                _early_stop()
+                yield INVALID_RESPONSE
+                return
+            yield line
+            if normalize_line(line) is not None:
+                bullets += 1
+                if EARLY_STOP and bullets == BULLET_COUNT:
+                    _early_stop()
+                    return
+    finally:
+        stream.close()
+
+
+def fetch_message(payload, deadline=None):
+    ai_msg = "\n".join(stream_lines(payload, deadline))
+    if not ai_msg:
+        raise UpstreamError("Empty completion")
+    return ai_msg
+
+
+def stats():
+    adapter = _state["adapter"]
+    opened = 0
+    if adapter is not None:
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+    # urllib3 reopens a socket closed by an early stop on the same
+    # connection object without counting it, so count those here
+    opened += _state["early_stops"]
+    sent = _state["requests"]
+    reused = max(sent - opened, 0)
+    return {
+        "pid": _state["pid"],
+        "pool_connections": POOL_CONNECTIONS,
+        "pool_maxsize": POOL_MAXSIZE,
+        "requests": sent,
+        "early_stops": _state["early_stops"],
+        "prompt_tokens": _state["prompt_tokens"],
+        "completion_tokens": _state["completion_tokens"],
+        "cached_tokens": _state["cached_tokens"],
+        "cached_token_ratio": round(_state["cached_tokens"] / _state["prompt_tokens"], 3) if _state["prompt_tokens"] else 0.0,
+        "connections_opened": opened,
+        "connections_reused": reused,
+        "reuse_ratio": round(reused / sent, 3) if sent else 0.0
+    }